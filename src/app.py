@@ -1,276 +1,1000 @@
 # Packages
-from dash import Dash, html, dcc, callback, Output, Input, State
+from dash import Dash, html, dcc, callback, Output, Input, State, Patch, ctx, no_update
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
-import dash_mantine_components as dmc
-import plotly.express as px
+import plotly
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
+import os
+import hashlib
+import threading
+import uuid
+from collections import namedtuple
+from functools import lru_cache, wraps
 
 # Local
-from utils.func import importData, createSpatialVis, createMetadataTables, createStatisticsPlot
+from utils.func import importData, createSpatialVis, createMetadataTables, createStatisticsPlot, mapFontColor, statisticsPoints, statisticsSnapshot, formatMetadataTable, prepareTransects, createTrendHeatmap, createTrendPlot
+from utils.store import TransectStore
+from utils.cache import FigureCache, jobCache
+from utils.lod import LODPyramid, viewportFromRelayout
+from utils.cubes import StatsCube
+from utils.ingest import IngestWatcher, readManifests
+from utils.transport import encodeArray, encodeFigure
+from utils.coerce import CoercionCache
+from utils.sampling import Sampler
+from utils.rollups import SeasonalRollups
+from utils.metrics import Instruments
+from utils.resample import aggregator
+from utils.startup import readStartupHeader, readStartupBody, transectDates, dataFingerprint
+from utils.shared import attachFrame
+from utils.spatial import SpatialIndex, regionFromSelection, regionFromView, regionMask
 from utils.lang.en import *
 from utils.design.layout import *
 from utils.const import *
 
-# Data import and preprocess 
-df = importData('src/assets/data/PETERSON_FINAL.parquet')
-stations = importData('src/assets/data/stationlocations.parquet')
+# Offline summary of the dataset (python -m utils.startup), None if missing or stale
+startup = readStartupHeader(STARTUP_PATH, DATA_PATH)
 
-refline = df.copy()
-refline = refline[refline.file == '14322dat.txt']
-refline['name'] = 'REFERENCE LINE'
-df.datetime = pd.to_datetime(df.datetime)
-df['water_temp'] = df['water_temp'].combine_first(df['bow_temp'])
-transectDates = df.groupby('file')['datetime'].min().dt.date.astype(str).to_list()
-transectDates.sort()
-transectFiles = df.file.unique().tolist()
+# Store, metadata aggregates, map grid, trend rollups, sample orders and region index are swapped together on hot reload
+Indexes = namedtuple('Indexes', ['store', 'cube', 'lod', 'rollups', 'sampler', 'spatial'])
+
+def dataVersion(manifests: set) -> str:
+    """Identifies the loaded data, identical across workers that loaded the same files"""
+    return hashlib.sha1(','.join(sorted(manifests)).encode()).hexdigest()[:12] if manifests else 'base'
+
+def buildIndexes(store: TransectStore, cube: StatsCube, rollups: SeasonalRollups) -> Indexes:
+    sampler = Sampler(store)
+    sampler.sample(SAMPLE_MODE, SAMPLE_SIZE, SAMPLE_SEED) # default sample is drawn before the first request
+    return Indexes(store, cube, LODPyramid(store.df), rollups, sampler, SpatialIndex(store.df))
+
+def currentOnly(maxsize: int):
+    """lru_cache of a function of the indexes that only keeps entries for the current ones.
+
+    The cache is cleared when the indexes are swapped (setIndexes), and calls
+    still in flight on the old indexes are not cached, so no cache keeps a
+    replaced store (and its frame) alive.
+    """
+    def wrap(f):
+        cached = lru_cache(maxsize=maxsize)(f)
+
+        @wraps(f)
+        def call(idx: Indexes, *args):
+            if idx is not indexes:
+                return f(idx, *args)
+            value = cached(idx, *args)
+            if idx is not indexes: # swapped while this was built, don't keep it
+                cached.cache_clear()
+            return value
+        call.cache_clear = cached.cache_clear
+        return call
+    return wrap
+
+@currentOnly(maxsize=1)
+def transectDateList(idx: Indexes) -> list:
+    return transectDates(idx.store)
+
+# The dataset is loaded in a background thread so the server accepts traffic at once,
+# callbacks that arrive earlier wait for it
+indexes = None
+stations = refline = coercer = None
+manifests = set()
+loaded = threading.Event() # set once the load has finished, or failed with load_error
+load_error = None
+loader_pid = None
+loader_lock = threading.Lock()
+
+def loadData():
+    """Load the dataset and overlays, restore or build the indexes, then warm the slower paths"""
+    global load_error
+    try:
+        loadIndexes()
+    except Exception as e:
+        # Callbacks and /healthz report the failure instead of waiting on it
+        load_error = e
+        raise
+    finally:
+        loaded.set()
+
+    if INGEST_DIR:
+        IngestWatcher(INGEST_DIR, appendTransects, INGEST_INBOX, INGEST_INTERVAL, manifests).start()
+    warmCaches(indexes)
+
+def loadIndexes():
+    global stations, refline, coercer
+    if SHARED_DATA: # prepared and store-ordered by serve.py, mapped instead of read
+        df = attachFrame(SHARED_DATA)
+    else:
+        df = prepareTransects(importData(DATA_PATH, columns=DATA_COLUMNS))
+    stations = importData(STATIONS_PATH)
+
+    refline = df[df.file == REF_FILE].copy()
+    refline['name'] = 'REFERENCE LINE'
+    # Samples snapped onto the reference line, computed once per transect file
+    coercer = CoercionCache(refline)
+
+    store = TransectStore(df, dataVersion(manifests))
+    if startup is not None:
+        body = readStartupBody(STARTUP_PATH)
+        setIndexes(buildIndexes(store, body['cube'], body['rollups']))
+    else:
+        setIndexes(buildIndexes(store, StatsCube.fromFrame(store.df), SeasonalRollups.fromStore(store, PARAMS_TO_PLOT)))
+
+    # Previously ingested transect files go through the hot reload path
+    if INGEST_DIR:
+        ingested, names = readManifests(INGEST_DIR, manifests)
+        if ingested is not None:
+            appendTransects(ingested, names)
+        manifests.update(names)
+
+def startLoading():
+    """Start the loader once per process, forked workers that missed it start their own"""
+    global loader_pid
+    with loader_lock:
+        if loader_pid != os.getpid() and not loaded.is_set():
+            loader_pid = os.getpid()
+            threading.Thread(target=loadData, name='data-loader', daemon=True).start()
+
+def currentIndexes() -> Indexes:
+    """The current indexes, waiting for the background load if it hasn't finished"""
+    if not loaded.is_set():
+        startLoading()
+        if not loaded.wait(LOAD_TIMEOUT):
+            raise TimeoutError(f'Dataset still loading after {LOAD_TIMEOUT}s')
+    if load_error is not None:
+        raise RuntimeError('Dataset failed to load') from load_error
+    return indexes
+
+def setIndexes(new: Indexes):
+    """Make new the current indexes, dropping cached selections of the previous ones"""
+    global indexes
+    indexes = new
+    for cached in (selectionRows, selectionSnapshot, transectDateList):
+        cached.cache_clear()
+
+def appendTransects(new: pd.DataFrame, names: list):
+    """Hot-reload newly ingested rows into the indexes without re-reading history"""
+    old = indexes
+    # Re-ingested files replace their previous rows
+    replaced = old.store.df.file.isin(new.file.unique())
+    base = old.store.df[~replaced]
+    manifests.update(names)
+    store = TransectStore(pd.concat([base, new], ignore_index=True), dataVersion(manifests))
+    cube = old.cube.copy()
+    cube.update(new)
+    coercer.forget(new.file.unique())
+    # Only months/seasons with new or replaced rows are recomputed
+    rollups = old.rollups.copy()
+    rollups.update(store, pd.concat([old.store.df.datetime[replaced], new.datetime]))
+    setIndexes(buildIndexes(store, cube, rollups))
+
+def cacheDiskPath(cache_dir: str) -> str:
+    """Disk tier file of the figure cache, one per dataset and output format so a restart on new data starts empty"""
+    if not cache_dir:
+        return None
+    os.makedirs(cache_dir, exist_ok=True)
+    digest = dataFingerprint(DATA_PATH)[1][:16] if os.path.exists(DATA_PATH) else 'nodata'
+    return os.path.join(cache_dir, f'figures-{digest}-v{CACHE_VERSION}-plotly{plotly.__version__}.sqlite')
+
+# Memoized callback outputs, optionally shared on disk across workers
+cache = FigureCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, disk_path=cacheDiskPath(CACHE_DIR))
+
+def backgroundManager(path: str):
+    """Dash background callback manager on a diskcache shared by all workers, None runs callbacks inline"""
+    if not path:
+        return None
+    from dash import DiskcacheManager
+
+    class JobManager(DiskcacheManager):
+        def terminate_job(self, job):
+            """Kill a job that is still running, without waiting for it to exit
+
+            Dash also calls this for every finished job once its result is read,
+            then waits up to a second for the exit. A job forked by another
+            worker can't be reaped here, so that wait ran out on about every
+            other poll and held the job cache's lock meanwhile.
+            """
+            import psutil
+            if job is None:
+                return
+            with self.handle.transact():
+                try:
+                    proc = psutil.Process(int(job))
+                    if proc.status() == psutil.STATUS_ZOMBIE:
+                        return
+                    procs = proc.children(recursive=True) + [proc]
+                except psutil.NoSuchProcess:
+                    return
+                for proc in procs:
+                    try:
+                        proc.kill()
+                    except psutil.NoSuchProcess:
+                        pass
+
+    return JobManager(jobCache(path))
+
+# Slow figure callbacks run as background jobs when PETERSON_BACKGROUND_DIR is set
+background = backgroundManager(BACKGROUND_DIR)
+background_args = dict(background=background is not None, manager=background, interval=BACKGROUND_INTERVAL)
+
+# Renders handed to background jobs, each with a job (request), result and current (latest request) store
+JOB_NAMES = ['spatial', 'stats', 'trends']
+
+def cachedOrJob(requests: list) -> list:
+    """Values of (key, builder) requests, None on a miss that is left to a background job.
+
+    Cache hits are answered in the request thread, only misses pay for a
+    forked job. Jobs hand their results back through the disk tier, so
+    background jobs need PETERSON_CACHE_DIR (serve.py sets one).
+    """
+    values = []
+    for key, build in requests:
+        value = cache.get(key)
+        if value is None:
+            if background is not None:
+                return None
+            value = build()
+            cache.put(key, value)
+        values.append(value)
+    return values
+
+def jobRequest(args: list) -> dict:
+    """Data of a {name}-job store. Dash keys job results on the callback's arguments and the
+    first poll to read a result deletes it, so every request gets an id of its own"""
+    return {'args': args, 'id': uuid.uuid4().hex}
+
+def jobResult(name: str, outputs: list):
+    """Apply a job's result in the browser, unless a later request has been answered since"""
+    app.clientside_callback(
+        """
+        function(result, current) {
+            if (!result || JSON.stringify(result[0]) !== JSON.stringify(current)) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            return result[1];
+        }
+        """,
+        [Output(*o, allow_duplicate=True) for o in outputs],
+        Input(f'{name}-result', 'data'),
+        State(f'{name}-current', 'data'),
+        prevent_initial_call=True
+    )
 
 # App init
 app = Dash(
     __name__,
     title = 'SF Bay Flowthrough',
+    compress=True,
     external_stylesheets=[dbc.themes.BOOTSTRAP, dbc.icons.BOOTSTRAP]
 )
 
-# Set application layout
-app.layout = (
-    html.Div(className='div-body', children=[
-        dbc.Navbar(children=[                       # Use row and col to control vertical alignment of logo / brand
-            dbc.Row([
-                dbc.Col(children=html.A(href=USGS_HREF, children=html.Img(src=BRAND_LOGO, className="navbar-img")), className='nav-img-col', width=1),
-                dbc.Col(children=dbc.NavbarBrand(headerTitle, className="navbar-title"), className='nav-title-col'),
-                dbc.Col(children=html.A(href=PETERSON_HREF, children=html.H6("ABOUT", className='nav-about')), className='nav-about-col', width=1),
+# Cache hit/miss counters for scraping
+@app.server.route('/cache-stats')
+def cache_stats():
+    return cache.stats()
+
+# Callback stage timings under /metrics and in Server-Timing headers (PETERSON_PROFILE=1)
+instruments = Instruments(PROFILE, PROFILER, PROFILE_SLOW_MS, PROFILE_RATE, PROFILE_DIR)
+instruments.install(app.server, gauges={'cache': cache.stats})
+
+# Liveness/readiness for deploy health checks, answers before the dataset has loaded
+@app.server.route('/healthz')
+def healthz():
+    if load_error is not None:
+        return {'status': 'failed', 'error': repr(load_error)}, 503
+    return {'status': 'ready' if loaded.is_set() else 'loading'}
+
+def globalMetadataTable(summary: pd.DataFrame):
+    """Metadata table of the whole dataset, empty until the data is known"""
+    if summary is None:
+        return None
+    return dbc.Table.from_dataframe(formatMetadataTable(summary), striped=True, bordered=True, hover=True, className='metadata-table')
+
+def datasetSummary() -> tuple:
+    """Date list, row count and global metadata summary without waiting for the data to load"""
+    if loaded.is_set() and load_error is None:
+        store, cube = indexes.store, indexes.cube
+        return transectDateList(indexes), len(store), cache.getOrBuild(('metadata-global', store.version), cube.summary)
+    if startup is not None:
+        return startup['dates'], startup['rows'], startup['metadata']
+    return [], None, None # filled in by update_data_version once loaded
+
+# Application layout, served as a function so it never waits on the dataset
+def serveLayout():
+    dates, rows, summary = datasetSummary()
+    return (
+        html.Div(className='div-body', children=[
+            dbc.Navbar(children=[                       # Use row and col to control vertical alignment of logo / brand
+                dbc.Row([
+                    dbc.Col(children=html.A(href=USGS_HREF, children=html.Img(src=BRAND_LOGO, className="navbar-img")), className='nav-img-col', width=1),
+                    dbc.Col(children=dbc.NavbarBrand(headerTitle, className="navbar-title"), className='nav-title-col'),
+                    dbc.Col(children=html.A(href=PETERSON_HREF, children=html.H6("ABOUT", className='nav-about')), className='nav-about-col', width=1),
+                ],
+                    align="center",
+                    className="navbar-row",
+                ),
             ],
-                align="center",
-                className="navbar-row",
+                #html.Img(src=RV_PETERSON, className="navbar-peterson")],
+            color="#00264C",
+            dark=True,
+            className="navbar drop-shadow"
             ),
-        ],
-            #html.Img(src=RV_PETERSON, className="navbar-peterson")],
-        color="#00264C",
-        dark=True,
-        className="navbar drop-shadow"
-        ),
-        # Begin body
-        dbc.Row(align='top', children=[
-            dbc.Col(className='col1', children=[
-            dbc.Container(className='option-container', children=[
-                dbc.Card(className='option-card drop-shadow', children=[
-                    dbc.Row(dbc.ModalTitle('FILTER OPTIONS', className='option-header')),
-                    html.Hr(className='option-hr'),
-                    dbc.Row(dbc.ModalTitle('Parameter:', className='option-modal')),
-                    dcc.Dropdown(
-                        options=[{'label': 'Chlorophyll', 'value': 'chlor'}, 
-                                 {'label': 'Salinity', 'value': 'salinity'}, 
-                                 {'label': 'Water Temperature', 'value': 'water_temp'}],
-                        value='salinity',
-                        placeholder='Salinity',
-                        clearable=False,
-                        id='param-select',
-                        className='option-select',
-                        style={'border-top': 'none', 
-                            'border-radius': '0px',
-                            'border-right': 'none'}
-                    ),
-                    dbc.Row(dbc.ModalTitle('Sample Size:', className='option-modal')),
-                    dcc.Input(
-                        type='number',
-                        value=1000,
-                        placeholder='1000',
-                        debounce=True,
-                        step=1,
-                        min=1,
-                        max=len(df),
-                        id='sample-size',
-                        className='option-select',
-                        style={
-                            'border-top': 'none',
-                            'border-right': 'none',
-                            'border-width': '1px',
-                            'border-color': 'lightgrey',
-                            'border-radius': '0px'
-                        }
-                    ),
-                    dbc.Row(dbc.ModalTitle('Sample Seed:', className='option-modal')),
-                    dcc.Input(
-                        type='number',
-                        placeholder='12345',
-                        value=12345,
-                        min=0,
-                        max=999999999,
-                        step=1,
-                        debounce=True,
-                        id='sample-seed',
-                        className='option-select',
-                        style={
-                            'border-top': 'none',
-                            'border-right': 'none',
-                            'border-width': '1px',
-                            'border-color': 'lightgrey',
-                            'border-radius': '0px'
-                        }
-                    ),
-                    dbc.Row(dbc.ModalTitle('Sample by Station:', className='option-modal')),
-                    dcc.Dropdown(
-                        options=STATION_IDS,
-                        value=None,
-                        placeholder='None selected...',
-                        clearable=True,
-                        multi=True,
-                        id='station-select',
-                        className='option-select',
-                        style={'border-top': 'none', 
-                            'border-radius': '0px',
-                            'border-right': 'none'}
-                    ),
-                    dbc.Row(dbc.ModalTitle('Sample by Date:', className='option-modal')),
-                    dcc.Dropdown(
-                        options=transectDates,
-                        value=None,
-                        placeholder='None selected...',
-                        id='date-select',
-                        className='option-select',
-                        style={'border-top': 'none', 
-                            'border-radius': '0px',
-                            'border-right': 'none'}
-                    ),
+            # Begin body
+            dbc.Row(align='top', children=[
+                dbc.Col(className='col1', children=[
+                dbc.Container(className='option-container', children=[
+                    dbc.Card(className='option-card drop-shadow', children=[
+                        dbc.Row(dbc.ModalTitle('FILTER OPTIONS', className='option-header')),
+                        html.Hr(className='option-hr'),
+                        dbc.Row(dbc.ModalTitle('Parameter:', className='option-modal')),
+                        dcc.Dropdown(
+                            options=[{'label': 'Chlorophyll', 'value': 'chlor'}, 
+                                     {'label': 'Salinity', 'value': 'salinity'}, 
+                                     {'label': 'Water Temperature', 'value': 'water_temp'}],
+                            value='salinity',
+                            placeholder='Salinity',
+                            clearable=False,
+                            id='param-select',
+                            className='option-select',
+                            style={'border-top': 'none', 
+                                'border-radius': '0px',
+                                'border-right': 'none'}
+                        ),
+                        dbc.Row(dbc.ModalTitle('Sample Size:', className='option-modal')),
+                        dcc.Input(
+                            type='number',
+                            value=SAMPLE_SIZE,
+                            placeholder='1000',
+                            debounce=True,
+                            step=1,
+                            min=1,
+                            max=rows,
+                            id='sample-size',
+                            className='option-select',
+                            style={
+                                'border-top': 'none',
+                                'border-right': 'none',
+                                'border-width': '1px',
+                                'border-color': 'lightgrey',
+                                'border-radius': '0px'
+                            }
+                        ),
+                        dbc.Row(dbc.ModalTitle('Sample Seed:', className='option-modal')),
+                        dcc.Input(
+                            type='number',
+                            placeholder='12345',
+                            value=SAMPLE_SEED,
+                            min=0,
+                            max=999999999,
+                            step=1,
+                            debounce=True,
+                            id='sample-seed',
+                            className='option-select',
+                            style={
+                                'border-top': 'none',
+                                'border-right': 'none',
+                                'border-width': '1px',
+                                'border-color': 'lightgrey',
+                                'border-radius': '0px'
+                            }
+                        ),
+                        dbc.Row(dbc.ModalTitle('Sample Mode:', className='option-modal')),
+                        dcc.Dropdown(
+                            options=[{'label': 'Random', 'value': 'uniform'},
+                                     {'label': 'Stratified by station', 'value': 'station'},
+                                     {'label': 'Stratified by date', 'value': 'date'}],
+                            value=SAMPLE_MODE,
+                            clearable=False,
+                            id='sample-mode',
+                            className='option-select',
+                            style={'border-top': 'none',
+                                'border-radius': '0px',
+                                'border-right': 'none'}
+                        ),
+                        dbc.Row(dbc.ModalTitle('Sample by Station:', className='option-modal')),
+                        dcc.Dropdown(
+                            options=STATION_IDS,
+                            value=None,
+                            placeholder='None selected...',
+                            clearable=True,
+                            multi=True,
+                            id='station-select',
+                            className='option-select',
+                            style={'border-top': 'none', 
+                                'border-radius': '0px',
+                                'border-right': 'none'}
+                        ),
+                        dbc.Row(dbc.ModalTitle('Sample by Date:', className='option-modal')),
+                        dcc.Dropdown(
+                            options=dates,
+                            value=None,
+                            placeholder='None selected...',
+                            id='date-select',
+                            className='option-select',
+                            style={'border-top': 'none', 
+                                'border-radius': '0px',
+                                'border-right': 'none'}
+                        ),
+                    ])
+                ]),
+                dbc.Container(className='option-container', children=[
+                    dbc.Card(className='option-card drop-shadow', children=[
+                        dbc.Row(dbc.ModalTitle('GRAPH OPTIONS', className='option-header')),
+                        html.Hr(className='option-hr'),
+                        dbc.Row(dbc.ModalTitle('Map Tile:', className='option-modal')),
+                        dcc.Dropdown(
+                            options=[{'label': 'Carto Positron (default)', 'value': 'carto-positron'},
+                                     {'label': 'Carto Darkmatter', 'value': 'carto-darkmatter'},
+                                     {'label': 'Open Street Map', 'value': 'open-street-map'}],
+                            value='carto-positron',
+                            placeholder='Carto Positron (default)',
+                            clearable=False,
+                            id='map-select',
+                            className='option-select',
+                            style={'border-top': 'none', 
+                                'border-radius': '0px',
+                                'border-right': 'none'}
+                        ),
+                        dbc.Checklist(className='station-toggle', id='station-toggle',
+                                      options=[{"label": "Toggle stations", "value": 1}],
+                                      value=[0],
+                                      switch=True),
+                        dbc.Checklist(className='station-toggle', id='ref-toggle',
+                                      options=[{"label": "Toggle reference line", "value": 1}],
+                                      value=[0],
+                                      switch=True),
+                        dbc.Checklist(className='station-toggle', id='coerce-toggle',
+                                      options=[{"label": "Coerce to reference line", "value": 1}],
+                                      value=[0],
+                                      switch=True),
+                        dbc.Checklist(className='station-toggle', id='parity-toggle',
+                                      options=[{"label": "Show resampling error", "value": 1}],
+                                      value=[0],
+                                      switch=True),
+                        dbc.Checklist(className='station-toggle', id='viewport-toggle',
+                                      options=[{"label": "Limit statistics to map view", "value": 1}],
+                                      value=[0],
+                                      switch=True),
+                    ])
                 ])
             ]),
-            dbc.Container(className='option-container', children=[
-                dbc.Card(className='option-card drop-shadow', children=[
-                    dbc.Row(dbc.ModalTitle('GRAPH OPTIONS', className='option-header')),
-                    html.Hr(className='option-hr'),
-                    dbc.Row(dbc.ModalTitle('Map Tile:', className='option-modal')),
-                    dcc.Dropdown(
-                        options=[{'label': 'Carto Positron (default)', 'value': 'carto-positron'},
-                                 {'label': 'Carto Darkmatter', 'value': 'carto-darkmatter'},
-                                 {'label': 'Open Street Map', 'value': 'open-street-map'}],
-                        value='carto-positron',
-                        placeholder='Carto Positron (default)',
-                        clearable=False,
-                        id='map-select',
-                        className='option-select',
-                        style={'border-top': 'none', 
-                            'border-radius': '0px',
-                            'border-right': 'none'}
-                    ),
-                    dbc.Checklist(className='station-toggle', id='station-toggle',
-                                  options=[{"label": "Toggle stations", "value": 1}],
-                                  value=[0],
-                                  switch=True),
-                    dbc.Checklist(className='station-toggle', id='ref-toggle',
-                                  options=[{"label": "Toggle reference line", "value": 1}],
-                                  value=[0],
-                                  switch=True),
-                    dbc.Checklist(className='station-toggle', id='coerce-toggle',
-                                  options=[{"label": "Coerce to reference line", "value": 1}],
-                                  value=[0],
-                                  switch=True),
-                ])
-            ])
-        ]),
-            dbc.Container(className='map-container', fluid=True, children=[
-                dbc.Card(className='map-card drop-shadow', children=[
-                    dbc.Row(children=[
-                        dbc.ModalTitle('TRANSECT VISUALIZATION', className='map-modal'),
-                        dbc.Button("Toggle Metadata", id='metadata-button', className='metadata-button'),
-                        dbc.Button("Reset Filters", id='reset-button', className='reset-button btn-danger', color='danger')
-                    ]),
-                    dcc.Loading(id='spatial-loading', className='spatial-loading', children=[
-                        dcc.Graph(id='spatial-plot', className='spatial-plot',
-                        style={'height': '70vh'},
-                        config={'displayModeBar': False},
-                        figure={'layout': go.Layout(xaxis={'showgrid': False, 'zeroline': False, 'showticklabels': False}, 
-                                                    yaxis={'showgrid': False, 'zeroline': False, 'showticklabels': False}
-                    )})],
-                        overlay_style={"visibility":"visible", "opacity": 0.65},                        
-                        parent_style={"visibility":"visible", "backgroundColor": "white"},
-                        type='cube',
-                        color='#00264C'
-                    ),
-                    dbc.Fade(className='metadata-fade', id='metadata-fade', is_in=False, children=[
-                        dbc.Card(className='metadata-card', children=[
-                            dbc.ModalTitle('Dataset Metadata', className='metadata-modal'),
-                            dbc.Table.from_dataframe(createMetadataTables(df), striped=True, bordered=True, hover=True, className='metadata-table'),
-                            dbc.ModalTitle('Selection Metadata', className='metadata-modal'),
-                            html.Div(id='metadata-sample')
+                dbc.Container(className='map-container', fluid=True, children=[
+                    dbc.Card(className='map-card drop-shadow', children=[
+                        dbc.Row(children=[
+                            dbc.ModalTitle('TRANSECT VISUALIZATION', className='map-modal'),
+                            dbc.Button("Toggle Metadata", id='metadata-button', className='metadata-button'),
+                            dbc.Button("Reset Filters", id='reset-button', className='reset-button btn-danger', color='danger')
+                        ]),
+                        dcc.Loading(id='spatial-loading', className='spatial-loading', children=[
+                            dcc.Graph(id='spatial-plot', className='spatial-plot',
+                            style={'height': '70vh'},
+                            config={'displaylogo': False, 'modeBarButtonsToRemove': ['toImage']}, # box/lasso select tools
+                            figure={'layout': go.Layout(xaxis={'showgrid': False, 'zeroline': False, 'showticklabels': False}, 
+                                                        yaxis={'showgrid': False, 'zeroline': False, 'showticklabels': False}
+                        )})],
+                            overlay_style={"visibility":"visible", "opacity": 0.65},                        
+                            parent_style={"visibility":"visible", "backgroundColor": "white"},
+                            type='cube',
+                            color='#00264C'
+                        ),
+                        dbc.Fade(className='metadata-fade', id='metadata-fade', is_in=False, children=[
+                            dbc.Card(className='metadata-card', children=[
+                                dbc.ModalTitle('Dataset Metadata', className='metadata-modal'),
+                                html.Div(id='metadata-global', children=globalMetadataTable(summary)),
+                                dbc.ModalTitle('Selection Metadata', className='metadata-modal'),
+                                html.Div(id='metadata-sample')
+                            ])
                         ])
                     ])
                 ])
-            ])
-        ]),
-        dbc.Row(className='stats-row', children=[
-            dbc.Container(className='stats-container', children=[
-                dbc.Card(className='stats-card drop-shadow', children=[
-                    dbc.Row(className='stats-title-row', children=[
-                        dbc.ModalTitle('SELECTION STATISTICS', className='map-modal', style={'padding-left': '17px'})
-                    ]),
-                    dcc.Loading(id='statistical-loading', className='spatial-loading', children=[
-                        dcc.Graph(id='stats-plot', className='stats-plot',
-                        style={'height': '70vh'},
-                        config={'displayModeBar': False},
-                        figure={'layout': go.Layout(xaxis={'showgrid': False, 'zeroline': False, 'showticklabels': False}, 
-                                                    yaxis={'showgrid': False, 'zeroline': False, 'showticklabels': False})}
-                        )],
-                        overlay_style={"visibility":"visible", "opacity": 0.65},                        
-                        parent_style={"visibility":"visible", "backgroundColor": "white"},
-                        type='cube',
-                        color='#00264C'
-                    ),
+            ]),
+            dbc.Row(className='stats-row', children=[
+                dbc.Container(className='stats-container', children=[
+                    dbc.Card(className='stats-card drop-shadow', children=[
+                        dbc.Row(className='stats-title-row', children=[
+                            dbc.ModalTitle('SELECTION STATISTICS', className='map-modal', style={'padding-left': '17px'})
+                        ]),
+                        dcc.Loading(id='statistical-loading', className='spatial-loading', children=[
+                            dcc.Graph(id='stats-plot', className='stats-plot',
+                            style={'height': '70vh'},
+                            config={'displayModeBar': False},
+                            figure={'layout': go.Layout(xaxis={'showgrid': False, 'zeroline': False, 'showticklabels': False}, 
+                                                        yaxis={'showgrid': False, 'zeroline': False, 'showticklabels': False})}
+                            )],
+                            overlay_style={"visibility":"visible", "opacity": 0.65},                        
+                            parent_style={"visibility":"visible", "backgroundColor": "white"},
+                            type='cube',
+                            color='#00264C'
+                        ),
+                    ])
+                ])
+            ]),
+            dbc.Row(className='stats-row', children=[
+                dbc.Container(className='stats-container', children=[
+                    dbc.Card(className='stats-card drop-shadow', children=[
+                        dbc.Row(className='stats-title-row', children=[
+                            dbc.Col(dbc.ModalTitle('TRENDS', className='map-modal', style={'padding-left': '17px'})),
+                            dbc.Col(width=3, children=dbc.RadioItems(
+                                options=[{'label': 'Monthly', 'value': 'month'},
+                                         {'label': 'Seasonal', 'value': 'season'}],
+                                value='month',
+                                inline=True,
+                                id='trend-period')),
+                        ]),
+                        dcc.Loading(id='trend-loading', className='spatial-loading', children=[
+                            dcc.Graph(id='trend-heatmap', className='stats-plot',
+                            style={'height': '45vh'},
+                            config={'displayModeBar': False}),
+                            dcc.Graph(id='trend-plot', className='stats-plot',
+                            style={'height': '35vh'},
+                            config={'displayModeBar': False}),
+                            ],
+                            overlay_style={"visibility":"visible", "opacity": 0.65},
+                            parent_style={"visibility":"visible", "backgroundColor": "white"},
+                            type='cube',
+                            color='#00264C'
+                        ),
+                    ])
                 ])
-            ])
+            ]),
+            dcc.Store(id='selection-key'),
+            dcc.Store(id='lod-key'),
+            dcc.Store(id='map-sample'),
+            dcc.Store(id='spatial-event'),
+            dcc.Store(id='spatial-query'),
+            dcc.Store(id='data-version'),
+            *[dcc.Store(id=f'{name}-{part}') for name in JOB_NAMES for part in ('job', 'result', 'current')],
+            dcc.Interval(id='data-poll', interval=INGEST_INTERVAL * 1000, disabled=not INGEST_DIR)
         ])
-    ])
-)
+    )
+
+app.layout = serveLayout
+
+def selectionKey(samp_size, samp_seed, sta_select, date, samp_mode=SAMPLE_MODE) -> tuple:
+    """Normalized, hashable description of the selected rows"""
+    if not date and not sta_select:
+        return ('sample', samp_mode, int(samp_size), int(samp_seed))
+    stations = tuple(sorted(sta_select)) if sta_select else ()
+    return ('select', date or None, stations)
+
+def transport(fig):
+    """Figure as sent to the browser, with typed-array encoding if enabled"""
+    if not BINARY_TRANSPORT:
+        return fig
+    with instruments.stage('encode'):
+        return encodeFigure(fig)
 
-# Callback for updating the main plot
+def freezeKey(key) -> tuple:
+    """Selection key back from its JSON (list) form"""
+    return tuple(freezeKey(k) if isinstance(k, list) else k for k in key)
+
+@currentOnly(maxsize=64)
+def selectionRows(idx: Indexes, sel_key: tuple, region: tuple=None, coerced: bool=False):
+    """Row positions (or slice) in the store for a selection key, optionally only those inside a map region
+
+    With coerced, the region is tested against the positions snapped onto the
+    reference line, where the map draws the points, instead of the stored ones.
+    """
+    if sel_key[0] == 'sample': # neither, sample to speed things up
+        _, samp_mode, samp_size, samp_seed = sel_key
+        rows = idx.sampler.sample(samp_mode, samp_size, samp_seed)
+    else:
+        _, date, sta_select = sel_key
+        rows = idx.store.rows(date, list(sta_select))
+    if region is None or not coerced:
+        return idx.spatial.within(region, rows)
+    rows = np.arange(len(idx.store))[rows] if isinstance(rows, slice) else rows
+    moved = coercer.coerce(idx.store, rows)
+    return rows[regionMask(region, moved['lon'], moved['lat'])]
+
+def selectionFrame(idx: Indexes, sel_key: tuple, region: tuple=None, coerced: bool=False) -> pd.DataFrame:
+    rows = selectionRows(idx, sel_key, region, coerced)
+    if isinstance(rows, slice):
+        return idx.store.df.iloc[rows]
+    return idx.store.df.take(rows)
+
+def coercedFrame(idx: Indexes, sel_key: tuple, region: tuple=None) -> pd.DataFrame:
+    """Selection with positions snapped to the reference line and an along_track column"""
+    return coercer.frame(idx.store, selectionRows(idx, sel_key, region, True), selectionFrame(idx, sel_key, region, True))
+
+@currentOnly(maxsize=8)
+def selectionSnapshot(idx: Indexes, sel_key: tuple, color: str, coerced: bool=False, region: tuple=None) -> dict:
+    """Sorted columnar snapshot of a selection for the statistics plot and its zoom"""
+    if coerced:
+        return statisticsSnapshot(coercedFrame(idx, sel_key, region), color, 'along_track')
+    return statisticsSnapshot(selectionFrame(idx, sel_key, region), color)
+
+def warmCaches(idx: Indexes):
+    """Pay the one-off import and first-selection costs before the first user does"""
+    import plotly.express
+    aggregator('minmaxlttb')
+    selectionSnapshot(idx, selectionKey(SAMPLE_SIZE, SAMPLE_SEED, None, None), 'water_temp')
+    cache.getOrBuild(('metadata-global', idx.store.version), idx.cube.summary)
+
+# Data selection stage, the selected rows stay server-side behind a key
 @callback(
-    Output('spatial-plot', 'figure'),
-    Output('metadata-sample', 'children'),
-    Output('stats-plot', 'figure'),
-    Input('param-select', 'value'),
+    Output('selection-key', 'data'),
     Input('sample-size', 'value'),
     Input('sample-seed', 'value'),
     Input('station-select', 'value'),
     Input('date-select', 'value'),
+    Input('sample-mode', 'value'),
+)
+def update_selection(samp_size, samp_seed, sta_select, date, samp_mode):
+    if samp_size is None or samp_seed is None:
+        raise PreventUpdate
+    return selectionKey(samp_size, samp_seed, sta_select, date, samp_mode)
+
+def spatialFrame(idx: Indexes, sel_key: tuple, param: str, coerce_t: list, view_key: tuple) -> pd.DataFrame:
+    """Map points of a selection in the viewport, raw or aggregated per grid cell"""
+    with instruments.stage('select') as t:
+        rows = selectionRows(idx, sel_key)
+        dfs = coercedFrame(idx, sel_key) if coerce_t == [0, 1] else selectionFrame(idx, sel_key)
+        t.rows = len(dfs)
+    with instruments.stage('decimate') as t:
+        dfl = idx.lod.decimate(dfs, rows, param, view_key, LOD_MAX_POINTS, moved=coerce_t == [0, 1])
+        t.rows = len(dfl)
+    return dfl
+
+# Per-point arrays of the map's sample trace, besides marker.color
+SAMPLE_TRACE_ARRAYS = ('lat', 'lon', 'hovertext', 'customdata')
+
+def spatialRequest(idx: Indexes, sel_key: tuple, param: str, coerce_t: list, view_key: tuple,
+                   mapTile: str, station_t: list, ref_t: list) -> tuple:
+    """Cache key and builder of the map figure, built with its raw point count (None if aggregated)"""
+    def build():
+        dfl = spatialFrame(idx, sel_key, param, coerce_t, view_key)
+        n_raw = len(dfl) if 'count' not in dfl else None
+        with instruments.stage('figure'):
+            fig = createSpatialVis(dfl, stations, refline, param, mapTile, station_t, ref_t, coerce_t)
+            if spatialShown(sel_key, param, coerce_t, view_key, n_raw) and not BINARY_TRANSPORT:
+                plainSampleTrace(fig.data[0])
+        return transport(fig), n_raw
+
+    return ('spatial', idx.store.version, BINARY_TRANSPORT, sel_key, param, view_key, mapTile, tuple(station_t), tuple(ref_t), tuple(coerce_t)), build
+
+def spatialShown(sel_key: tuple, param: str, coerce_t: list, view_key: tuple, n_raw: int):
+    """map-sample state of a rendered map, lets a later larger sample only append points"""
+    return (sel_key, param, coerce_t, view_key, n_raw) if sel_key[0] == 'sample' and n_raw is not None else None
+
+def plainSampleTrace(trace):
+    """Sample point arrays as JSON lists, which a later larger sample can Extend.
+    Plotly >= 6 would send numpy arrays as typed arrays, which the renderer can't extend"""
+    # Cleared first, plotly ignores assigning equal values
+    for attr in SAMPLE_TRACE_ARRAYS:
+        values, trace[attr] = np.asarray(trace[attr]).tolist(), None
+        trace[attr] = values
+    values, trace.marker.color = np.asarray(trace.marker.color).tolist(), None
+    trace.marker.color = values
+
+def shownSamplePoints(shown, sel_key: tuple, param: str, coerce_t: list, view_key: tuple):
+    """Raw points on the map if sel_key only enlarges the sample shown, otherwise None"""
+    if not shown or sel_key[0] != 'sample':
+        return None
+    last_key, last_param, last_coerce, last_view, n_shown = freezeKey(shown)
+    same = (last_key[:2] == sel_key[:2] and last_key[3] == sel_key[3] and last_key[2] < sel_key[2]
+            and last_param == param and last_coerce == tuple(coerce_t) and last_view == view_key)
+    return n_shown if same else None
+
+# Callback for rendering the transect map, refined as the viewport changes
+@callback(
+    Output('spatial-plot', 'figure'),
+    Output('lod-key', 'data'),
+    Output('map-sample', 'data'),
+    Output('spatial-job', 'data'),
+    Output('spatial-current', 'data'),
+    Input('selection-key', 'data'),
+    Input('param-select', 'value'),
+    Input('coerce-toggle', 'value'),
+    Input('spatial-plot', 'relayoutData'),
+    State('lod-key', 'data'),
+    State('map-sample', 'data'),
+    State('map-select', 'value'),
+    State('station-toggle', 'value'),
+    State('ref-toggle', 'value'),
+)
+def update_spatial(sel_key, param, coerce_t, relayout, last_view, last_sample, mapTile, station_t, ref_t):
+    if sel_key is None:
+        raise PreventUpdate
+    idx = currentIndexes()
+    view_key = idx.lod.viewKey(*viewportFromRelayout(relayout, MAP_CENTER, MAP_ZOOM))
+    # Pans within the same tiles at the same zoom level need no new points
+    if ctx.triggered_id == 'spatial-plot' and last_view and freezeKey(last_view) == view_key:
+        raise PreventUpdate
+    sel_key = freezeKey(sel_key)
+    args = [sel_key, param, coerce_t, view_key, mapTile, station_t, ref_t]
+
+    # A larger sample with the same mode and seed only appends its new points
+    n_shown = None
+    if ctx.triggered_id == 'selection-key' and not BINARY_TRANSPORT:
+        n_shown = shownSamplePoints(last_sample, sel_key, param, coerce_t, view_key)
+    if n_shown is not None:
+        dfl = spatialFrame(idx, sel_key, param, coerce_t, view_key)
+        if 'count' not in dfl:
+            fig = no_update
+            if len(dfl) > n_shown:
+                with instruments.stage('figure'):
+                    new = createSpatialVis(dfl.iloc[n_shown:], stations, refline, param, mapTile, station_t, ref_t, coerce_t).data[0]
+                fig = Patch()
+                for attr in SAMPLE_TRACE_ARRAYS:
+                    fig['data'][0][attr].extend(np.asarray(new[attr]).tolist())
+                fig['data'][0]['marker']['color'].extend(np.asarray(new.marker.color).tolist())
+            return fig, view_key, (sel_key, param, coerce_t, view_key, len(dfl)), no_update, args
+
+    values = cachedOrJob([spatialRequest(idx, *args)])
+    if values is None:
+        job = jobRequest(args)
+        return no_update, view_key, no_update, job, job
+    fig, n_raw = values[0]
+    return fig, view_key, spatialShown(*args[:4], n_raw), no_update, args
+
+@callback(
+    Output('spatial-result', 'data'),
+    Input('spatial-job', 'data'),
+    prevent_initial_call=True,
+    **background_args
+)
+def render_spatial(job):
+    args = job['args']
+    sel_key, param, coerce_t, view_key, *style = args
+    sel_key, view_key = freezeKey(sel_key), freezeKey(view_key)
+    fig, n_raw = cache.getOrBuild(*spatialRequest(currentIndexes(), sel_key, param, coerce_t, view_key, *style))
+    return [job, [fig, spatialShown(sel_key, param, coerce_t, view_key, n_raw)]]
+
+jobResult('spatial', [('spatial-plot', 'figure'), ('map-sample', 'data')])
+
+# Map tile and overlay toggles only patch the existing figure
+@callback(
+    Output('spatial-plot', 'figure', allow_duplicate=True),
     Input('map-select', 'value'),
     Input('station-toggle', 'value'),
     Input('ref-toggle', 'value'),
+    prevent_initial_call=True
+)
+def update_map_style(mapTile, station_t, ref_t):
+    fig = Patch()
+    fig['layout']['mapbox']['style'] = mapTile
+    fig['layout']['font']['color'] = mapFontColor(mapTile)
+    fig['data'][1]['visible'] = ref_t == [0, 1]
+    fig['data'][2]['visible'] = station_t == [0, 1]
+    return fig
+
+# Map region (box/lasso selection, or the view when toggled) the statistics and metadata are limited to.
+# Bursts of pans and zooms are debounced in the browser, only the last one reaches the server
+app.clientside_callback(
+    f"""
+    function(relayout, selected, viewport_t) {{
+        if (relayout && (relayout['mapbox._derived'] || relayout['mapbox.center'])) {{
+            window.spatialView = relayout;
+        }}
+        const call = window.spatialCall = (window.spatialCall || 0) + 1;
+        const region = selected && {{range: selected.range, lassoPoints: selected.lassoPoints}};
+        return new Promise(resolve => setTimeout(() => resolve(call === window.spatialCall
+            ? [window.spatialView || null, region || null, viewport_t]
+            : window.dash_clientside.no_update), {SPATIAL_DEBOUNCE_MS}));
+    }}
+    """,
+    Output('spatial-event', 'data'),
+    Input('spatial-plot', 'relayoutData'),
+    Input('spatial-plot', 'selectedData'),
+    Input('viewport-toggle', 'value'),
+)
+
+@callback(
+    Output('spatial-query', 'data'),
+    Input('spatial-event', 'data'),
+    State('spatial-query', 'data'),
+)
+def update_region(event, last_region):
+    if event is None:
+        raise PreventUpdate
+    view, selected, viewport_t = event
+    region = regionFromSelection(selected)
+    if region is None and viewport_t == [0, 1]:
+        region = regionFromView(view, MAP_CENTER, MAP_ZOOM)
+    if region == (freezeKey(last_region) if last_region else None):
+        raise PreventUpdate
+    return region
+
+# Callback for the selection metadata table
+@callback(
+    Output('metadata-sample', 'children'),
+    Input('selection-key', 'data'),
+    Input('spatial-query', 'data'),
     Input('coerce-toggle', 'value'),
 )
-def update_graph_filters(param, samp_size, samp_seed, sta_select, date, mapTile, station_t, ref_t, coerce_t):
-    dfg = df.copy()
-    dfg.datetime = pd.to_datetime(dfg.datetime)
-        # For now, sample data if not already sampled by a date to speed things up
-    if not date and not sta_select: # neither
-        dfg = dfg.sample(n=samp_size, random_state=samp_seed)
-    elif date and not sta_select: # date, not station       
-        dfg = dfg[dfg.datetime.dt.date.astype(str) == date]
-    elif sta_select and not date: # station, not date
-        dfg = dfg[dfg.station_id.isin(sta_select)]
-    else: # both
-        dfg = dfg[(dfg.station_id.isin(sta_select)) & (dfg.datetime.dt.date.astype(str) == date)]
-
-    # Figure and tables for transect vis
-    fig_transect = createSpatialVis(dfg, stations, refline, param, mapTile, station_t, ref_t, coerce_t)   
-    table = dbc.Table.from_dataframe(createMetadataTables(dfg), striped=True, bordered=True, hover=True, className='metadata-table')
-
-    # Figures for statistical vis
-    fig_stats = createStatisticsPlot(dfg, "water_temp")
-
-    return fig_transect, table, fig_stats
+def update_metadata(sel_key, region, coerce_t):
+    if sel_key is None:
+        raise PreventUpdate
+    sel_key = freezeKey(sel_key)
+    region = freezeKey(region) if region else None
+    # The region is tested where the map draws the points, so coercion matters only with a region
+    coerced = coerce_t == [0, 1] and region is not None
+    idx = currentIndexes()
+
+    def build():
+        if sel_key[0] == 'select' and region is None: # date/station selections merge precomputed aggregates
+            with instruments.stage('cube'):
+                return formatMetadataTable(idx.cube.summary(sel_key[1], list(sel_key[2])))
+        with instruments.stage('select') as t:
+            dfs = selectionFrame(idx, sel_key, region, coerced)
+            t.rows = len(dfs)
+        with instruments.stage('describe'):
+            return createMetadataTables(dfs)
+
+    md = cache.getOrBuild(('metadata', idx.store.version, sel_key, region, coerced), build)
+    return dbc.Table.from_dataframe(md, striped=True, bordered=True, hover=True, className='metadata-table')
+
+# Callback for the statistics subplots
+def statsRequest(idx: Indexes, sel_key: list, parity_t: list, coerce_t: list, region: list) -> tuple:
+    """Cache key and builder of the statistics figure"""
+    sel_key = freezeKey(sel_key)
+    region = freezeKey(region) if region else None
+    parity = parity_t == [0, 1]
+    coerced = coerce_t == [0, 1]
+
+    def build():
+        with instruments.stage('snapshot') as t:
+            snap = selectionSnapshot(idx, sel_key, "water_temp", coerced, region)
+            t.rows = len(snap['x'])
+        with instruments.stage('figure'):
+            fig = createStatisticsPlot(snap, "water_temp", STATS_MAX_POINTS, parity)
+        return transport(fig)
+
+    return ('stats', idx.store.version, BINARY_TRANSPORT, sel_key, 'water_temp', STATS_MAX_POINTS, parity, coerced, region), build
+
+@callback(
+    Output('stats-plot', 'figure'),
+    Output('stats-job', 'data'),
+    Output('stats-current', 'data'),
+    Input('selection-key', 'data'),
+    Input('parity-toggle', 'value'),
+    Input('coerce-toggle', 'value'),
+    Input('spatial-query', 'data'),
+)
+def update_stats(sel_key, parity_t, coerce_t, region):
+    if sel_key is None:
+        raise PreventUpdate
+    args = [sel_key, parity_t, coerce_t, region]
+    idx = currentIndexes()
+    values = cachedOrJob([statsRequest(idx, *args)])
+    if values is None:
+        # The snapshot is built here, where zooms reuse it, and the forked job inherits it
+        with instruments.stage('snapshot'):
+            selectionSnapshot(idx, freezeKey(sel_key), 'water_temp', coerce_t == [0, 1], freezeKey(region) if region else None)
+        job = jobRequest(args)
+        return no_update, job, job
+    return values[0], no_update, args
+
+@callback(
+    Output('stats-result', 'data'),
+    Input('stats-job', 'data'),
+    prevent_initial_call=True,
+    **background_args
+)
+def render_stats(job):
+    return [job, [cache.getOrBuild(*statsRequest(currentIndexes(), *job['args']))]]
+
+jobResult('stats', [('stats-plot', 'figure')])
+
+# Re-aggregate statistics subplots over the zoomed x range
+@callback(
+    Output('stats-plot', 'figure', allow_duplicate=True),
+    Input('stats-plot', 'relayoutData'),
+    State('selection-key', 'data'),
+    State('coerce-toggle', 'value'),
+    State('spatial-query', 'data'),
+    prevent_initial_call=True
+)
+def update_stats_zoom(relayout, sel_key, coerce_t, region):
+    if not relayout or sel_key is None:
+        raise PreventUpdate
+    snap = None
+    fig = Patch()
+    for k, param in enumerate(PARAMS_TO_PLOT):
+        axis = 'xaxis' if k == 0 else f'xaxis{k + 1}'
+        if f'{axis}.range[0]' in relayout:
+            x_range = (relayout[f'{axis}.range[0]'], relayout[f'{axis}.range[1]'])
+        elif f'{axis}.autorange' in relayout:
+            x_range = None
+        else:
+            continue
+        if snap is None:
+            snap = selectionSnapshot(currentIndexes(), freezeKey(sel_key), 'water_temp', coerce_t == [0, 1],
+                                     freezeKey(region) if region else None)
+        with instruments.stage(f'resample-{param}') as t:
+            x, y, c, _ = statisticsPoints(snap, param, 'water_temp', STATS_MAX_POINTS, x_range)
+            t.rows = len(x)
+        if BINARY_TRANSPORT:
+            x, y, c = encodeArray(x), encodeArray(y), encodeArray(c)
+        fig['data'][k]['x'] = x
+        fig['data'][k]['y'] = y
+        fig['data'][k]['marker']['color'] = c
+    if snap is None:
+        raise PreventUpdate
+    return fig
+
+# Station x time trends of the selected parameter, from the precomputed rollups
+def trendRequests(indexes: Indexes, param: str, period: str, sta_select: list) -> list:
+    """Cache keys and builders of the trend heatmap and plot"""
+    store, rollups = indexes.store, indexes.rollups
+    stations = tuple(sorted(sta_select)) if sta_select else ()
+
+    def buildHeatmap():
+        with instruments.stage('heatmap'):
+            fig = createTrendHeatmap(rollups.heatmap(param, period), param)
+        return transport(fig)
+
+    def buildTrend():
+        with instruments.stage('trend'):
+            fig = createTrendPlot(rollups.trend(param, period, list(stations)), param)
+        return transport(fig)
+
+    return [(('trend-heatmap', store.version, BINARY_TRANSPORT, param, period), buildHeatmap),
+            (('trend', store.version, BINARY_TRANSPORT, param, period, stations), buildTrend)]
+
+@callback(
+    Output('trend-heatmap', 'figure'),
+    Output('trend-plot', 'figure'),
+    Output('trends-job', 'data'),
+    Output('trends-current', 'data'),
+    Input('param-select', 'value'),
+    Input('trend-period', 'value'),
+    Input('station-select', 'value'),
+    Input('data-version', 'data'),
+)
+def update_trends(param, period, sta_select, version):
+    args = [param, period, sta_select]
+    values = cachedOrJob(trendRequests(currentIndexes(), *args))
+    if values is None:
+        job = jobRequest(args)
+        return no_update, no_update, job, job
+    return *values, no_update, args
+
+@callback(
+    Output('trends-result', 'data'),
+    Input('trends-job', 'data'),
+    prevent_initial_call=True,
+    **background_args
+)
+def render_trends(job):
+    return [job, [cache.getOrBuild(key, build) for key, build in trendRequests(currentIndexes(), *job['args'])]]
+
+jobResult('trends', [('trend-heatmap', 'figure'), ('trend-plot', 'figure')])
+
+# Refresh the date list, sample size limit and global metadata once loaded and after new transects are ingested
+@callback(
+    Output('date-select', 'options'),
+    Output('sample-size', 'max'),
+    Output('metadata-global', 'children'),
+    Output('data-version', 'data'),
+    Input('data-poll', 'n_intervals'),
+    State('data-version', 'data'),
+)
+def update_data_version(n, version):
+    if not loaded.is_set() and startup is not None:
+        # The startup summary describes the base data until the load finishes
+        if version == startup['version']:
+            raise PreventUpdate
+        return startup['dates'], startup['rows'], globalMetadataTable(startup['metadata']), startup['version']
+    store = currentIndexes().store
+    if version == store.version:
+        raise PreventUpdate
+    dates, rows, summary = datasetSummary()
+    return dates, rows, globalMetadataTable(summary), store.version
 
 # Callback for updating sample size/seed dropdown availability
 @callback(
     Output('sample-size', 'disabled'),
     Output('sample-seed', 'disabled'),
+    Output('sample-mode', 'disabled'),
     Input('date-select', 'value'),
     Input('station-select', 'value')
 )
 def update_fields(date_sel, sta_select):
     if date_sel or sta_select:
-        return True, True
-    return False, False
+        return True, True, True
+    return False, False, False
 
 # Metadata button callback
 @callback(
@@ -297,18 +1021,24 @@ def metadata_button(n, is_in):
     Output('param-select', 'value'),
     Output('sample-size', 'value'),
     Output('sample-seed', 'value'),
+    Output('sample-mode', 'value'),
     Output('station-select', 'value'),
     Output('date-select', 'value'),
     Output('map-select', 'value'),
     Output('station-toggle', 'value'),
     Output('ref-toggle', 'value'),
     Output('coerce-toggle', 'value'),
+    Output('parity-toggle', 'value'),
+    Output('viewport-toggle', 'value'),
+    Output('spatial-plot', 'selectedData'),
     Input('reset-button', 'n_clicks'),
 )
 def reset_filters(n):
-    return 'salinity', 1000, 12345, None, None, 'carto-positron', [0], [0], [0]
+    return 'salinity', SAMPLE_SIZE, SAMPLE_SEED, SAMPLE_MODE, None, None, 'carto-positron', [0], [0], [0], [0], [0], None
     
 
+startLoading()
+
 # App run
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
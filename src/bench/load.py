@@ -0,0 +1,97 @@
+"""Callback throughput of a running server, to check how serving scales with workers.
+
+Concurrent clients post statistics plot or metadata table updates for
+distinct sample seeds (cache misses) or one seed (cache hits), following
+cache misses into their background jobs until they finish, and report requests per second
+and latency percentiles. Compare e.g. `serve.py --workers 1` with `--workers 4`.
+
+Run from src/:  python -m bench.load [--url http://127.0.0.1:8050] [--clients 8] [--requests 200]
+"""
+import argparse
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.const import *
+
+
+def requestBody(outputs: list, inputs: list) -> dict:
+    """_dash-update-component request of a callback, outputs as (id, property) pairs"""
+    outputs = [{'id': id, 'property': prop} for id, prop in outputs]
+    if len(outputs) == 1:
+        output, outputs = f"{outputs[0]['id']}.{outputs[0]['property']}", outputs[0]
+    else:
+        output = '..' + '...'.join(f"{o['id']}.{o['property']}" for o in outputs) + '..'
+    return {'output': output, 'outputs': outputs, 'inputs': inputs,
+            'changedPropIds': [f"{inputs[0]['id']}.{inputs[0]['property']}"], 'state': []}
+
+
+def updateBody(target: str, seed: int) -> dict:
+    """Request of a target callback for a default-size sample"""
+    key = {'id': 'selection-key', 'property': 'data', 'value': ['sample', SAMPLE_MODE, SAMPLE_SIZE, seed]}
+    region = {'id': 'spatial-query', 'property': 'data', 'value': None} # no map selection
+    coerce = {'id': 'coerce-toggle', 'property': 'value', 'value': [0]}
+    if target == 'stats':
+        inputs = [key, {'id': 'parity-toggle', 'property': 'value', 'value': [0]}, coerce, region]
+        return requestBody([('stats-plot', 'figure'), ('stats-job', 'data'), ('stats-current', 'data')], inputs)
+    return requestBody([('metadata-sample', 'children')], [key, region, coerce])
+
+
+def jobBody(target: str, job: dict) -> dict:
+    """Request of the background job rendering a cache miss"""
+    return requestBody([(f'{target}-result', 'data')], [{'id': f'{target}-job', 'property': 'data', 'value': job}])
+
+
+def post(url: str, body: dict, query: str='') -> dict:
+    req = urllib.request.Request(f'{url}/_dash-update-component{query}', data=json.dumps(body).encode(),
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read() or b'{}')
+
+
+def update(url: str, target: str, body: dict) -> float:
+    """Seconds until the callback output arrives, polling background jobs like the renderer"""
+    start = time.perf_counter()
+    job = post(url, body).get('response', {}).get(f'{target}-job')
+    if job:
+        body = jobBody(target, job['data'])
+        out = post(url, body)
+        query = f"?cacheKey={out['cacheKey']}&job={out['job']}"
+        while 'response' not in out:
+            time.sleep(BACKGROUND_INTERVAL / 1000)
+            out = post(url, body, query)
+            if not out:
+                # No content: the job ended without a result, the renderer stops polling too
+                raise RuntimeError(f'{target} job {job["data"]} ended without a result')
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8050')
+    parser.add_argument('--target', choices=['stats', 'metadata'], default='stats')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--hits', action='store_true', help='repeat one seed so every request is a cache hit')
+    args = parser.parse_args()
+
+    # Seeds are offset by the start time so repeated runs don't hit each other's cache entries
+    base = int(time.time())
+    bodies = [updateBody(args.target, SAMPLE_SEED if args.hits else base + i) for i in range(args.requests)]
+    # Dash registers its callbacks on the first request, concurrent first requests can miss them.
+    # serve.py workers register theirs before serving, this covers a single app.py process
+    urllib.request.urlopen(f'{args.url}/_dash-dependencies').read()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as pool:
+        latency = np.array(list(pool.map(lambda body: update(args.url, args.target, body), bodies)))
+    wall = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(latency, [50, 95, 99]) * 1000
+    print(f'{args.requests} {args.target} requests, {args.clients} clients: {args.requests / wall:.1f} req/s, '
+          f'p50 {p50:.0f} ms, p95 {p95:.0f} ms, p99 {p99:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Response payload size of the figures with JSON number lists vs base64 typed arrays.
+
+Run from src/:  python -m bench.payload [--rows 1000000]
+"""
+import argparse
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+from utils.const import *
+from utils.func import createSpatialVis, createStatisticsPlot
+from utils.store import TransectStore
+from utils.transport import decodeArray, encodeFigure
+from bench.synthetic import syntheticTransects
+
+
+def textFigure(obj):
+    """Figure dict with every typed array written out as a JSON list, as plotly.py 5 sends it"""
+    if isinstance(obj, dict):
+        if 'bdata' in obj and 'dtype' in obj:
+            return decodeArray(obj).tolist()
+        return {k: textFigure(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [textFigure(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return obj
+
+
+def sizes(fig) -> dict:
+    fig = fig.to_plotly_json()
+    out = {}
+    for name, body in [('json', json.dumps(textFigure(fig), default=str)),
+                       ('bdata f8', to_json_plotly(encodeFigure(fig, float32=False))),
+                       ('bdata f4', to_json_plotly(encodeFigure(fig)))]:
+        raw = body.encode()
+        out[name] = (len(raw), len(gzip.compress(raw, 6)))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    store = TransectStore(syntheticTransects(args.rows))
+    stations = pd.DataFrame({'Station_Number': STATION_IDS[:35],
+                             'lat': np.linspace(38.05, 37.5, 35), 'lon': np.linspace(-121.75, -122.45, 35)})
+    refline = store.df.iloc[:0].assign(name='REFERENCE LINE')
+    selections = {
+        'sample 1000': store.df.sample(n=1000, random_state=12345),
+        'one date': store.select(store.dates[len(store.dates) // 2]),
+        'four stations': store.select(stations=[36, 30, 20, 10]),
+    }
+
+    print(f"{'selection':>14} {'figure':>16} {'encoding':>9} {'raw KB':>10} {'gzip KB':>10}")
+    for label, dfg in selections.items():
+        figures = {
+            f'map ({len(dfg):,})': createSpatialVis(dfg, stations, refline, 'salinity', 'carto-positron', [0], [0], [0]),
+            'stats resampled': createStatisticsPlot(dfg, 'water_temp', STATS_MAX_POINTS),
+        }
+        for fig_name, fig in figures.items():
+            for enc, (raw, gz) in sizes(fig).items():
+                print(f'{label:>14} {fig_name:>16} {enc:>9} {raw / 1024:>10.1f} {gz / 1024:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Micro-benchmark of createStatisticsPlot against the previous per-trace implementation.
+
+Run from src/:  python -m bench.statistics [--rows 10000 100000 1000000]
+"""
+import argparse
+import math
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from utils.const import *
+from utils.func import createStatisticsPlot
+from bench.synthetic import syntheticTransects
+
+
+def legacyStatisticsPlot(dfg: pd.DataFrame, color: str="chlor") -> go.Figure:
+    """createStatisticsPlot before vectorization: a full sort and colorbar per subplot"""
+    n_rows = math.ceil(len(PARAMS_TO_PLOT) / 3)
+    n_cols = min(len(PARAMS_TO_PLOT), 3)
+    PARAMS_TO_PLOT_rs = np.array(PARAMS_TO_PLOT).reshape(n_rows, n_cols)
+    titles = [t[0] + ' ' + t[1] for t in PARAM_NAME_UNIT_DICT.values()]
+    fig = make_subplots(rows=n_rows, cols=n_cols, start_cell='top-left', subplot_titles=titles)
+    for i in range(1, n_rows + 1):
+        for j in range(1, n_cols + 1):
+            dfg = dfg.sort_values(PARAMS_TO_PLOT_rs[i-1][j-1], ascending=True)
+            fig.add_trace(go.Scatter(x=dfg.d_from_start, y=dfg[PARAMS_TO_PLOT_rs[i-1][j-1]], mode='markers',
+                marker=dict(size=4, color=dfg[color], showscale=True, colorscale='viridis',
+                            colorbar=dict(title=f'{PARAM_NAME_UNIT_DICT[color][0]} {PARAM_NAME_UNIT_DICT[color][1]}',
+                                          thickness=20))),
+                row=i, col=j)
+    return fig
+
+
+def measure(fn, *args, repeat: int=3) -> dict:
+    """Best wall time and peak traced memory of fn(*args), with the length of a frame/array result"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    out = fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {'seconds': min(times), 'peak_mb': peak / 2**20}
+    if isinstance(out, (pd.DataFrame, np.ndarray)):
+        result['out_rows'] = len(out)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    variants = {
+        'legacy': lambda dfg: legacyStatisticsPlot(dfg, 'water_temp'),
+        'vectorized': lambda dfg: createStatisticsPlot(dfg, 'water_temp'),
+        'resampled': lambda dfg: createStatisticsPlot(dfg, 'water_temp', STATS_MAX_POINTS),
+    }
+    print(f"{'rows':>10} {'variant':>12} {'seconds':>9} {'peak MB':>9}")
+    for n in args.rows:
+        dfg = syntheticTransects(n)
+        for name, fn in variants.items():
+            r = measure(fn, dfg, repeat=args.repeat)
+            print(f"{n:>10,} {name:>12} {r['seconds']:>9.3f} {r['peak_mb']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""Benchmark suite: load, index, filter and figure builder timings on synthetic data.
+
+Times and memory-profiles every selection path of the former
+update_graph_filters callback (legacy pandas masks and the TransectStore) and
+each utils.func builder, at each requested size, and writes JSON results that
+can be compared across commits.
+
+Run from src/:  python -m bench.suite [--rows 10000 100000 1000000] [--out results.json] [--compare old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import plotly
+
+from utils.const import *
+from utils.func import (importData, prepareTransects, convertToArrow, createSpatialVis, createMetadataTables,
+                        formatMetadataTable, createStatisticsPlot, statisticsSnapshot, createTrendHeatmap,
+                        createTrendPlot)
+from utils.store import TransectStore
+from utils.cubes import StatsCube
+from utils.lod import LODPyramid, boundsFromCenter
+from utils.rollups import SeasonalRollups
+from utils.sampling import Sampler
+from utils.coerce import ReferenceLine, CoercionCache
+from utils.spatial import SpatialIndex, regionMask
+from utils.transport import encodeFigure
+from bench.statistics import measure
+from bench.synthetic import writeSynthetic
+
+SELECT_STATIONS = [36, 30, 20, 10]
+
+
+def legacyFilter(df: pd.DataFrame, samp_size: int, samp_seed: int, sta_select: list, date: str) -> pd.DataFrame:
+    """Row selection of update_graph_filters before the TransectStore"""
+    dfg = df.copy()
+    dfg.datetime = pd.to_datetime(dfg.datetime)
+    if not date and not sta_select:
+        return dfg.sample(n=samp_size, random_state=samp_seed)
+    if date and not sta_select:
+        return dfg[dfg.datetime.dt.date.astype(str) == date]
+    if sta_select and not date:
+        return dfg[dfg.station_id.isin(sta_select)]
+    return dfg[(dfg.station_id.isin(sta_select)) & (dfg.datetime.dt.date.astype(str) == date)]
+
+
+def gitCommit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchSize(n: int, args, record):
+    """Run every case at n rows, passing each result to record(group, case, result)"""
+    def run(group, case, fn, *fn_args, repeat=args.repeat):
+        result = measure(fn, *fn_args, repeat=repeat)
+        record(group, case, result)
+        return result
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Load paths, the data is written in chunks so large sizes never sit in memory twice
+        parquet = os.path.join(tmp, 'synthetic.parquet')
+        arrow = os.path.join(tmp, 'synthetic.arrow')
+        start = time.perf_counter()
+        writeSynthetic(parquet, n, seed=args.seed)
+        record('load', 'generate parquet', {'seconds': time.perf_counter() - start})
+        start = time.perf_counter()
+        convertToArrow(parquet, arrow)
+        record('load', 'convert arrow', {'seconds': time.perf_counter() - start})
+        run('load', 'importData parquet', importData, parquet, DATA_COLUMNS, repeat=1)
+        run('load', 'importData arrow', importData, arrow, DATA_COLUMNS, repeat=1)
+        df = prepareTransects(importData(parquet, columns=DATA_COLUMNS))
+
+    # Startup indexes
+    run('index', 'prepareTransects', lambda: prepareTransects(df.copy()), repeat=1)
+    run('index', 'TransectStore', TransectStore, df, repeat=1)
+    store = TransectStore(df)
+    run('index', 'StatsCube', StatsCube.fromFrame, store.df, repeat=1)
+    cube = StatsCube.fromFrame(store.df)
+    run('index', 'LODPyramid', LODPyramid, store.df, repeat=1)
+    lod = LODPyramid(store.df)
+    run('index', 'SeasonalRollups', SeasonalRollups.fromStore, store, PARAMS_TO_PLOT, repeat=1)
+    rollups = SeasonalRollups.fromStore(store, PARAMS_TO_PLOT)
+    refline = store.df[store.df.file == store.df.file.iloc[0]].assign(name='REFERENCE LINE')
+    run('index', 'ReferenceLine', ReferenceLine, refline, repeat=1)
+    coercer = CoercionCache(refline)
+    coercer.ref # built here rather than in the first coerce timing
+    sampler = Sampler(store)
+    run('index', 'SpatialIndex', SpatialIndex, store.df, repeat=1)
+    spatial = SpatialIndex(store.df)
+    for mode in ('uniform', 'station', 'date'):
+        # First sample of a seed, its draw order starts empty
+        run('index', f'first sample {mode}', lambda m=mode: Sampler(store).sample(m, SAMPLE_SIZE, SAMPLE_SEED), repeat=1)
+
+    # Filter paths of the old update_graph_filters: sample, date, stations, date + stations
+    date = store.dates[len(store.dates) // 2]
+    paths = {
+        'sample': (SAMPLE_SIZE, SAMPLE_SEED, None, None),
+        'date': (SAMPLE_SIZE, SAMPLE_SEED, None, date),
+        'stations': (SAMPLE_SIZE, SAMPLE_SEED, SELECT_STATIONS, None),
+        'date+stations': (SAMPLE_SIZE, SAMPLE_SEED, SELECT_STATIONS, date),
+    }
+    for name, (samp_size, samp_seed, sta_select, sel_date) in paths.items():
+        if n <= args.legacy_max:
+            run('filter', f'legacy {name}', legacyFilter, store.df, samp_size, samp_seed, sta_select, sel_date)
+        if name == 'sample':
+            for mode in ('uniform', 'station', 'date'):
+                run('filter', f'store sample {mode}', lambda m=mode: store.df.take(sampler.sample(m, samp_size, samp_seed)))
+        else:
+            run('filter', f'store {name}', store.select, sel_date, sta_select)
+
+    # Map region queries against a plain scan: a zoomed-out view, a zoomed-in view and a lasso inside it
+    lon, lat = store.df.lon.to_numpy(), store.df.lat.to_numpy()
+    regions = {
+        'bbox wide': ('bbox', -122.2, 37.7, -122.0, 37.85),
+        'bbox narrow': ('bbox', -121.97, 37.87, -121.95, 37.89),
+        'lasso': ('polygon', ((-121.97, 37.89), (-121.95, 37.89), (-121.96, 37.87))),
+    }
+    for name, region in regions.items():
+        run('filter', f'region scan {name}', lambda r=region: np.flatnonzero(regionMask(r, lon, lat)))
+        run('filter', f'region index {name}', spatial.query, region)
+
+    # Figure and table builders on typical selections
+    stations = pd.DataFrame({'Station_Number': STATION_IDS[:35],
+                             'lat': np.linspace(38.05, 37.5, 35), 'lon': np.linspace(-121.75, -122.45, 35)})
+    view_key = lod.viewKey(MAP_ZOOM, boundsFromCenter(MAP_CENTER, MAP_ZOOM))
+    selections = {
+        'sample': sampler.sample('uniform', SAMPLE_SIZE, SAMPLE_SEED),
+        'date': np.arange(*store.dateRange(date)),
+        'stations': store.rows(stations=SELECT_STATIONS),
+    }
+    for sel, rows in selections.items():
+        dfg = store.df.take(rows)
+        run(f'builder {sel}', 'LODPyramid.decimate', lod.decimate, dfg, rows, 'salinity', view_key, LOD_MAX_POINTS)
+        dfl = lod.decimate(dfg, rows, 'salinity', view_key, LOD_MAX_POINTS)
+        run(f'builder {sel}', 'coerce', coercer.frame, store, rows, dfg)
+        run(f'builder {sel}', 'createSpatialVis', createSpatialVis, dfl, stations, refline, 'salinity',
+            'carto-positron', [0], [0], [0])
+        spatial = createSpatialVis(dfl, stations, refline, 'salinity', 'carto-positron', [0], [0], [0])
+        run(f'builder {sel}', 'encodeFigure spatial', lambda: encodeFigure(spatial.to_plotly_json()))
+        run(f'builder {sel}', 'createMetadataTables', createMetadataTables, dfg)
+        run(f'builder {sel}', 'statisticsSnapshot', statisticsSnapshot, dfg, 'water_temp')
+        run(f'builder {sel}', 'createStatisticsPlot', createStatisticsPlot, dfg, 'water_temp')
+        run(f'builder {sel}', 'createStatisticsPlot resampled', createStatisticsPlot, dfg, 'water_temp', STATS_MAX_POINTS)
+    run('builder date', 'StatsCube.summary', lambda: formatMetadataTable(cube.summary(date)))
+    run('builder stations', 'StatsCube.summary', lambda: formatMetadataTable(cube.summary(None, SELECT_STATIONS)))
+    run('builder trends', 'createTrendHeatmap', lambda: createTrendHeatmap(rollups.heatmap('salinity'), 'salinity'))
+    run('builder trends', 'createTrendPlot', lambda: createTrendPlot(rollups.trend('salinity', stations=SELECT_STATIONS), 'salinity'))
+
+
+def compare(results: list, baseline: str):
+    """Print time and memory ratios against an earlier results file"""
+    with open(baseline) as f:
+        old = {(r['rows'], r['group'], r['case']): r for r in json.load(f)['results']}
+    print(f"\n{'rows':>10} {'group':>18} {'case':>32} {'time x':>8} {'mem x':>8}")
+    for r in results:
+        prev = old.get((r['rows'], r['group'], r['case']))
+        if not prev:
+            continue
+        t = r['seconds'] / prev['seconds'] if prev['seconds'] else float('nan')
+        m = r['peak_mb'] / prev['peak_mb'] if prev.get('peak_mb') and 'peak_mb' in r else float('nan')
+        print(f"{r['rows']:>10,} {r['group']:>18} {r['case']:>32} {t:>8.2f} {m:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--legacy-max', type=int, default=5_000_000, help='skip legacy filters above this many rows')
+    parser.add_argument('--out', help='results JSON, defaults to bench-<commit>.json')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    commit = gitCommit()
+    results = []
+
+    def record(group, case, result):
+        results.append({'rows': n, 'group': group, 'case': case, **result})
+        mem = f"{result['peak_mb']:>9.1f}" if 'peak_mb' in result else f"{'':>9}"
+        print(f"{n:>10,} {group:>18} {case:>32} {result['seconds']:>9.4f} {mem} {result.get('out_rows', ''):>10}", flush=True)
+
+    print(f"{'rows':>10} {'group':>18} {'case':>32} {'seconds':>9} {'peak MB':>9} {'out rows':>10}")
+    for n in args.rows:
+        benchSize(n, args, record)
+
+    meta = {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'versions': {'numpy': np.__version__, 'pandas': pd.__version__, 'plotly': plotly.__version__},
+        'args': vars(args),
+    }
+    out = args.out or f'bench-{commit or "local"}.json'
+    with open(out, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=1)
+    print(f'\nwrote {out}')
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Synthetic flowthrough data matching the schema app.py expects
+
+Every transect file is generated from its own seeded stream, so the rows of a
+file are the same whether the data is built in memory or written in chunks,
+and any size from 10k to 50M rows is reproducible.
+
+Run from src/:  python -m bench.synthetic <rows> <dst.parquet|dst.arrow>
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.const import *
+from utils.func import convertToArrow
+
+
+def surveyStarts(n_files: int, seed: int=0) -> pd.DatetimeIndex:
+    """Start time of each survey file, in date order"""
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(0, 10_000, n_files))
+    return (pd.Timestamp('1994-11-29') + pd.to_timedelta(days, unit='D')
+            + pd.to_timedelta(rng.integers(5 * 60, 12 * 60, n_files), unit='min'))
+
+
+def syntheticFile(start: pd.Timestamp, n: int, seed: int, index: int) -> pd.DataFrame:
+    """One survey file of n rows starting at the head of the transect"""
+    rng = np.random.default_rng([seed, index])
+    t = np.arange(n) / n
+    stations = np.array(STATION_IDS[:35], dtype=float)
+    return pd.DataFrame({
+        'file': f'{start:%m%d%H%M}.{index % 1000:03d}',
+        'datetime': start + pd.to_timedelta(t * 9, unit='h'),
+        'lat': 38.05 - 0.55 * t + rng.normal(0, 0.003, n),
+        'lon': -121.75 - 0.7 * t + rng.normal(0, 0.003, n),
+        'station_id': stations[np.minimum((t * len(stations)).astype(int), len(stations) - 1)],
+        'd_from_start': t * 145,
+        'chlor': rng.gamma(2, 3, n),
+        'salinity': 32 * t + rng.normal(0, 1, n),
+        'turbidity': rng.gamma(2, 4, n),
+        'depth': rng.uniform(0, 25, n),
+        'water_temp': np.where(rng.random(n) < 0.4, np.nan, rng.normal(16, 3, n)),
+        'bow_temp': rng.normal(16, 3, n),
+        'air_temp': rng.normal(18, 4, n),
+        'dataset': 'synthetic',
+    })
+
+
+def fileSizes(n: int, rows_per_file: int) -> np.ndarray:
+    n_files = max(1, -(-n // rows_per_file))
+    sizes = np.full(n_files, rows_per_file)
+    sizes[-1] = n - rows_per_file * (n_files - 1)
+    return sizes
+
+
+def iterTransects(n: int, rows_per_file: int=12_000, seed: int=0, chunk_rows: int=2_000_000):
+    """Frames of about chunk_rows rows (whole files) that together make syntheticTransects(n)"""
+    sizes = fileSizes(n, rows_per_file)
+    starts = surveyStarts(len(sizes), seed)
+    files, rows = [], 0
+    for i, (start, size) in enumerate(zip(starts, sizes)):
+        files.append(syntheticFile(start, int(size), seed, i))
+        rows += size
+        if rows >= chunk_rows:
+            yield pd.concat(files, ignore_index=True)
+            files, rows = [], 0
+    if files:
+        yield pd.concat(files, ignore_index=True)
+
+
+def syntheticTransects(n: int, rows_per_file: int=12_000, seed: int=0) -> pd.DataFrame:
+    """n rows of transects along the bay, one file per survey"""
+    return pd.concat(iterTransects(n, rows_per_file, seed, chunk_rows=n), ignore_index=True)
+
+
+def writeSynthetic(dst: str, n: int, rows_per_file: int=12_000, seed: int=0, chunk_rows: int=2_000_000):
+    """Write n synthetic rows to parquet (or arrow) without holding them all in memory"""
+    parquet_dst = dst if dst.endswith('.parquet') else dst + '.parquet'
+    writer = None
+    for chunk in iterTransects(n, rows_per_file, seed, chunk_rows):
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(parquet_dst, table.schema, compression='zstd')
+        writer.write_table(table, row_group_size=1_000_000)
+    writer.close()
+    if parquet_dst != dst:
+        convertToArrow(parquet_dst, dst)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('rows', type=int)
+    parser.add_argument('dst')
+    parser.add_argument('--rows-per-file', type=int, default=12_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    writeSynthetic(args.dst, args.rows, args.rows_per_file, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Production server: gunicorn workers sharing one in-memory copy of the dataset columns.
+
+The dataset is read, prepared and sorted once in this process and published
+as an Arrow IPC segment in shared memory, which every worker maps instead of
+reading the parquet file (utils.shared). String columns and the row indexes
+are still built per worker. A missing or stale startup artifact is written
+first, so workers restore the metadata cube and trend rollups rather than
+each rebuilding them. Slow figure callbacks run as Dash
+background jobs on a diskcache directory shared by all workers, and the
+figure cache gets a disk tier so job results reach the request threads.
+
+Needs gunicorn (not available on Windows, use app.py there). From the repo root:
+    python src/serve.py [--workers N] [--threads 4] [--bind 0.0.0.0:8050]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bind', default='0.0.0.0:8050')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=4, help='request threads per worker')
+    parser.add_argument('--timeout', type=int, default=120, help='seconds before a stuck worker is restarted')
+    parser.add_argument('--no-background', dest='background', action='store_false',
+                        help='render figures in the request threads instead of background jobs')
+    args = parser.parse_args()
+
+    # Workers are forked from this process and inherit its utils.const, so their
+    # settings have to be in the environment before it is first imported
+    os.environ['PETERSON_SHARED_DATA'] = f'peterson-{os.getpid()}'
+    tmp_dirs = []
+    if not args.background:
+        os.environ.pop('PETERSON_BACKGROUND_DIR', None)
+    else:
+        # Jobs are forked processes, their figures only outlive them in the cache's disk tier
+        for var, prefix in (('PETERSON_BACKGROUND_DIR', 'peterson-jobs-'), ('PETERSON_CACHE_DIR', 'peterson-cache-')):
+            if not os.environ.get(var):
+                os.environ[var] = tempfile.mkdtemp(prefix=prefix)
+                tmp_dirs.append(os.environ[var])
+
+    from gunicorn.app.base import BaseApplication
+    from utils.const import DATA_PATH, DATA_COLUMNS, STARTUP_PATH, SHARED_DATA
+    from utils.func import importData, prepareTransects
+    from utils.store import TransectStore
+    from utils.shared import publishFrame
+    from utils.startup import readStartupHeader, writeStartup
+
+    store = TransectStore(prepareTransects(importData(DATA_PATH, columns=DATA_COLUMNS)))
+    if readStartupHeader(STARTUP_PATH, DATA_PATH) is None:
+        try:
+            writeStartup(STARTUP_PATH, DATA_PATH, store)
+        except OSError as e:
+            print(f'Startup artifact not written, workers build their own indexes: {e!r}')
+    shm = publishFrame(store.df, SHARED_DATA)
+    del store
+    print(f'Published {shm.size / 2**20:.0f} MB dataset as {shm.name}')
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', args.bind)
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('threads', args.threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('timeout', args.timeout)
+            self.cfg.set('preload_app', False) # each worker imports the app and attaches on its own
+
+        def load(self):
+            from app import app
+            # Dash registers its callbacks on the first request, concurrent first requests can miss them
+            app._setup_server()
+            return app.server
+
+    master = os.getpid()
+    try:
+        Server().run()
+    finally:
+        # Workers exit through this frame too, only the master owns the segment
+        if os.getpid() == master:
+            shm.close()
+            shm.unlink()
+            for path in tmp_dirs:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the app modules the way the app does, from src/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.synthetic import syntheticTransects
+from utils.store import TransectStore
+
+
+@pytest.fixture(scope='session')
+def store():
+    """Store over a few synthetic surveys, small enough for brute-force checks"""
+    return TransectStore(syntheticTransects(60_000, rows_per_file=6_000))
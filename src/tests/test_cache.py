@@ -0,0 +1,52 @@
+import pickle
+
+from utils.cache import FigureCache
+
+
+def test_entry_eviction():
+    cache = FigureCache(max_entries=3)
+    for i in range(4):
+        cache.put(('fig', i), {'i': i})
+    cache.get(('fig', 1)) # most recently used now
+    cache.put(('fig', 4), {'i': 4})
+    assert cache.get(('fig', 0)) is None
+    assert cache.get(('fig', 2)) is None
+    assert cache.get(('fig', 1)) == {'i': 1}
+    assert cache.stats()['entries'] == 3
+    assert cache.stats()['evictions'] == 2
+
+
+def test_byte_eviction():
+    value = 'x' * 1000
+    size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = FigureCache(max_entries=100, max_bytes=3 * size)
+    for i in range(5):
+        cache.put(i, value)
+    assert cache.stats()['entries'] == 3
+    assert cache.stats()['bytes'] <= 3 * size
+    assert cache.get(0) is None and cache.get(4) == value
+    # Larger than the whole budget, never held in memory
+    cache.put('big', 'x' * 10_000)
+    assert cache.get('big') is None
+
+
+def test_disk_tier(tmp_path):
+    path = str(tmp_path / 'figures.sqlite')
+    FigureCache(disk_path=path).put(('spatial', 'base'), [1, 2, 3])
+    # Another worker (or a restart) on the same file
+    other = FigureCache(disk_path=path)
+    assert other.get(('spatial', 'base')) == [1, 2, 3]
+    assert other.stats()['disk_hits'] == 1
+    assert other.get(('spatial', 'base')) == [1, 2, 3]
+    assert other.stats()['hits'] == 1
+    assert other.get(('spatial', 'other')) is None
+
+
+def test_disk_budget(tmp_path):
+    value = b'x' * 1000
+    cache = FigureCache(max_entries=1, disk_path=str(tmp_path / 'figures.sqlite'), disk_max_bytes=2500)
+    for i in range(5):
+        cache.put(i, value)
+    fresh = FigureCache(disk_path=cache.disk_path)
+    assert fresh.get(0) is None
+    assert fresh.get(4) == value
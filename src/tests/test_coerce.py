@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.coerce import KM_PER_DEG_LAT, CoercionCache, ReferenceLine
+
+
+def line(lats, lons):
+    return pd.DataFrame({'lat': lats, 'lon': lons,
+                         'datetime': pd.date_range('2000-01-01', periods=len(lats), freq='min')})
+
+
+def test_project_onto_meridian():
+    # Due south along one meridian, 0.1 deg lat apart
+    ref = ReferenceLine(line(np.linspace(38.0, 37.5, 6), np.full(6, -122.0)))
+    lat = np.array([37.95, 37.72, 37.5, 38.2])
+    lon = np.array([-121.99, -122.02, -122.0, -122.0])
+    out = ref.project(lat, lon)
+    np.testing.assert_allclose(out['lon'], -122.0, atol=1e-9)
+    # Past the end of the line snaps to its first vertex
+    np.testing.assert_allclose(out['lat'], [37.95, 37.72, 37.5, 38.0], atol=1e-9)
+    np.testing.assert_allclose(out['along_km'], (38.0 - out['lat']) * KM_PER_DEG_LAT, atol=1e-6)
+    assert out['offset_km'][2] == pytest.approx(0, abs=1e-9)
+    assert out['offset_km'][0] == pytest.approx(0.01 * 111.32 * np.cos(np.radians(37.75)), rel=1e-6)
+
+
+def test_project_corner():
+    # An L: east along 38N, then south; a point inside the corner goes to the nearer leg
+    ref = ReferenceLine(line([38.0, 38.0, 37.8], [-122.2, -122.0, -122.0]))
+    out = ref.project([37.99, 37.85], [-122.05, -122.01])
+    np.testing.assert_allclose(out['lat'], [38.0, 37.85], atol=1e-9)
+    np.testing.assert_allclose(out['lon'], [-122.05, -122.0], atol=1e-9)
+    assert out['along_km'][1] > out['along_km'][0]
+
+
+@pytest.mark.parametrize('lats', [[], [37.9], [37.9, 37.9]])
+def test_degenerate_line(lats):
+    ref = ReferenceLine(line(lats, [-122.0] * len(lats)))
+    out = ref.project([37.8, np.nan], [-122.0, -122.0])
+    assert all(np.isnan(v).all() for v in out.values())
+
+
+def test_coercion_cache_matches_project(store):
+    refline = store.df[store.df.file == store.df.file.iloc[0]]
+    coercer = CoercionCache(refline)
+    rows = np.arange(100, len(store), 97)
+    coerced = coercer.coerce(store, rows)
+    expected = coercer.ref.project(store.df.lat.to_numpy()[rows], store.df.lon.to_numpy()[rows])
+    for name in expected:
+        np.testing.assert_allclose(coerced[name], expected[name])
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.cubes import CUBE_PARAMS, StatsCube, TDigest
+
+
+@pytest.fixture(scope='module')
+def cube(store):
+    return StatsCube.fromFrame(store.df)
+
+
+def selections(store):
+    date = store.dates[3]
+    stations = list(store.station_rows)[5:9]
+    return [(None, None), (date, None), (None, stations), (date, stations)]
+
+
+def test_summary_matches_selection(store, cube):
+    for date, stations in selections(store):
+        summary = cube.summary(date, stations)
+        selected = store.select(date, stations)
+        described = selected[CUBE_PARAMS].describe()
+        for p in CUBE_PARAMS:
+            assert summary.loc[p, 'count'] == described.loc['count', p]
+            if p == 'datetime':
+                # Times are kept as float nanoseconds, exact to well under a microsecond
+                for stat in ('min', 'max'):
+                    assert abs(summary.loc[p, stat] - described.loc[stat, p]) < pd.Timedelta('1us')
+                # Partials are per day, so the median is exact over the rows' days rather than their times
+                assert summary.loc[p, '50%'] == selected.datetime.dt.normalize().median()
+                assert abs(summary.loc[p, '50%'] - described.loc['50%', p]) <= pd.Timedelta('1D')
+                continue
+            assert summary.loc[p, 'min'] == described.loc['min', p]
+            assert summary.loc[p, 'max'] == described.loc['max', p]
+            # The t-digest median is approximate, within a fraction of the value range
+            spread = described.loc['max', p] - described.loc['min', p]
+            assert abs(summary.loc[p, '50%'] - described.loc['50%', p]) <= 0.01 * spread
+
+
+def test_update_replaces_file_partials(store, cube):
+    file = store.df.file.iloc[0]
+    part = store.df[store.df.file == file].iloc[:100]
+    updated = cube.copy()
+    updated.update(part)
+    rest = store.df[store.df.file != file]
+    assert updated.summary().loc['chlor', 'count'] == rest.chlor.count() + part.chlor.count()
+    # The original cube keeps its partials
+    assert cube.summary().loc['chlor', 'count'] == store.df.chlor.count()
+
+
+def test_tdigest_quantiles():
+    values = np.random.default_rng(0).gamma(2, 3, 50_000)
+    digest = TDigest.merge([TDigest.fromValues(part) for part in np.array_split(values, 7)])
+    spread = values.max() - values.min()
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        assert abs(digest.quantile(q, values.min(), values.max()) - np.quantile(values, q)) <= 0.01 * spread
@@ -0,0 +1,65 @@
+import glob
+import os
+
+import pandas as pd
+
+from utils.ingest import IngestWatcher, ingestFile, readManifests
+
+
+def writeRaw(path, days, n=20, salinity=10.0):
+    """Raw comma-separated flowthrough file with n rows on each of days"""
+    times = [pd.Timestamp(day) + pd.Timedelta(minutes=i) for day in days for i in range(n)]
+    pd.DataFrame({
+        'DateTime': times, 'Latitude': 37.8, 'Longitude': -122.0, 'Station': 18,
+        'Sal': salinity, 'Chl': 1.5,
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def test_reingest_supersedes(tmp_path):
+    root = str(tmp_path / 'fragments')
+    raw = writeRaw(tmp_path / 'run1.txt', ['2020-01-01', '2020-01-02'])
+    first = ingestFile(raw, root)
+    df, seen = readManifests(root, set())
+    assert len(df) == 40 and seen == [os.path.basename(first)]
+
+    # The second ingest of the file replaces the first, on different days
+    raw = writeRaw(tmp_path / 'run1.txt', ['2020-01-02', '2020-01-03'], n=25, salinity=20.0)
+    second = ingestFile(raw, root)
+    assert not os.path.exists(first)
+    fragments = glob.glob(os.path.join(root, 'date=*', '*.parquet'))
+    assert not any('date=2020-01-01' in f for f in fragments)
+
+    df, names = readManifests(root, set(seen))
+    assert names == [os.path.basename(second)]
+    assert len(df) == 50 and (df.salinity == 20.0).all()
+    assert set(df.datetime.dt.strftime('%Y-%m-%d')) == {'2020-01-02', '2020-01-03'}
+    # Nothing new after that
+    assert readManifests(root, set(seen) | set(names)) == (None, [])
+
+
+def test_superseded_unread_manifest_is_skipped(tmp_path):
+    root = str(tmp_path / 'fragments')
+    first = ingestFile(writeRaw(tmp_path / 'run1.txt', ['2020-01-01']), root)
+    with open(first) as f:
+        listing = f.read()
+    second = ingestFile(writeRaw(tmp_path / 'run1.txt', ['2020-01-01'], n=5), root)
+    # A reader between the second commit and the first's removal sees both manifests
+    with open(first, 'w') as f:
+        f.write(listing)
+    df, names = readManifests(root, set())
+    assert len(df) == 5
+    assert names == sorted(os.path.basename(m) for m in (first, second))
+
+
+def test_failed_file_does_not_block_inbox(tmp_path):
+    root, inbox = str(tmp_path / 'fragments'), tmp_path / 'inbox'
+    inbox.mkdir()
+    (inbox / 'a_bad.txt').write_text('Latitude,Longitude\n37.8,-122.0\n')
+    writeRaw(inbox / 'good.txt', ['2020-01-01'])
+    loaded = []
+    IngestWatcher(root, lambda df, names: loaded.append(df), str(inbox)).poll()
+    assert len(loaded) == 1 and set(loaded[0].file) == {'good.txt'}
+    assert os.listdir(inbox / 'failed') == ['a_bad.txt']
+    assert os.listdir(inbox / 'done') == ['good.txt']
+    assert os.listdir(inbox / 'processing') == []
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from utils.lod import LOD_BITS, LODPyramid
+
+# Around the middle of the synthetic transect
+CENTER = {'lat': 37.8, 'lon': -122.1}
+BOUNDS = (-122.2, 37.7, -122.0, 37.9)
+
+
+@pytest.fixture(scope='module')
+def lod(store):
+    return LODPyramid(store.df)
+
+
+def inView(lod, store, view_key, rows):
+    """Rows whose cell lies in the view's tiles, by brute force"""
+    _, tile_bits, (x0, y0, x1, y1) = view_key
+    tx, ty = lod.mx[rows] >> (LOD_BITS - tile_bits), lod.my[rows] >> (LOD_BITS - tile_bits)
+    return rows[(tx >= x0) & (tx <= x1) & (ty >= y0) & (ty <= y1)]
+
+
+def test_under_budget_keeps_rows(lod, store):
+    view_key = lod.viewKey(12, BOUNDS)
+    rows = np.arange(0, len(store), 7)
+    out = lod.decimate(store.df.take(rows), rows, 'salinity', view_key, max_points=len(rows))
+    np.testing.assert_array_equal(out.index.to_numpy(), inView(lod, store, view_key, rows))
+    assert 'count' not in out
+
+
+def test_over_budget_aggregates(lod, store):
+    view_key = lod.viewKey(10, BOUNDS)
+    rows = np.arange(len(store))
+    shown = inView(lod, store, view_key, rows)
+    out = lod.decimate(store.df, rows, 'water_temp', view_key, max_points=200)
+    assert 0 < len(out) <= 200
+    # Every row in view lands in exactly one cell
+    assert out['count'].sum() == len(shown)
+    vals = store.df.water_temp.to_numpy()[shown]
+    assert np.nanmin(out.water_temp_min) == np.nanmin(vals)
+    assert np.nanmax(out.water_temp_max) == np.nanmax(vals)
+    ok = out.water_temp.notna()
+    assert (out.water_temp_min[ok] <= out.water_temp[ok] + 1e-9).all()
+    assert (out.water_temp[ok] <= out.water_temp_max[ok] + 1e-9).all()
+    # Cell positions are the mean of their rows, so they stay inside the rows' extent
+    lat = store.df.lat.to_numpy()[shown]
+    assert out.lat.between(lat.min(), lat.max()).all()
+
+
+def test_moved_positions(lod, store):
+    view_key = lod.viewKey(12, BOUNDS)
+    rows = np.arange(0, len(store), 5)
+    frame = store.df.take(rows)
+    # Points drawn far from their stored position are culled by where they are drawn
+    moved = frame.assign(lat=CENTER['lat'], lon=CENTER['lon'])
+    assert len(lod.decimate(moved, rows, 'salinity', view_key, len(rows), moved=True)) == len(rows)
+    away = frame.assign(lat=0.0, lon=0.0)
+    assert len(lod.decimate(away, rows, 'salinity', view_key, len(rows), moved=True)) == 0
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from utils.sampling import SAMPLE_MODES, Draws, Sampler
+
+
+def strataOf(store, mode):
+    """Stratum key of every row"""
+    if mode == 'station':
+        return store.df.station_id.to_numpy()
+    if mode == 'date':
+        return store.df.datetime.dt.normalize().to_numpy()
+    return np.zeros(len(store))
+
+
+@pytest.mark.parametrize('mode', SAMPLE_MODES)
+def test_prefix_stable(store, mode):
+    sampler = Sampler(store)
+    full = sampler.sample(mode, 5_000, 7)
+    for n in (1, 100, 1_234, 4_999):
+        np.testing.assert_array_equal(sampler.sample(mode, n, 7), full[:n])
+    # Same order from a fresh sampler, whatever was read before
+    np.testing.assert_array_equal(Sampler(store).sample(mode, 2_000, 7), full[:2_000])
+    assert not np.array_equal(sampler.sample(mode, 2_000, 8), full[:2_000])
+
+
+@pytest.mark.parametrize('mode', SAMPLE_MODES)
+def test_whole_store(store, mode):
+    rows = Sampler(store).sample(mode, len(store) + 10, 0)
+    np.testing.assert_array_equal(np.sort(rows), np.arange(len(store)))
+
+
+@pytest.mark.parametrize('mode', ['station', 'date'])
+def test_strata_balanced(store, mode):
+    keys = strataOf(store, mode)
+    _, sizes = np.unique(keys, return_counts=True)
+    n = 3_000
+    _, counts = np.unique(keys[Sampler(store).sample(mode, n, 3)], return_counts=True)
+    # Every stratum gets an equal share, give or take the leftover pick
+    share = min(n // len(sizes), sizes.min())
+    assert len(counts) == len(sizes)
+    assert counts.min() >= share and counts.max() <= share + 1
+
+
+def test_draws_permutation():
+    for n in (10, 1_024, 5_000):
+        drawn = Draws(n, 1).take(n)
+        np.testing.assert_array_equal(np.sort(drawn), np.arange(n))
+        np.testing.assert_array_equal(Draws(n, 1).take(n // 3), drawn[:n // 3])
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from utils.spatial import SpatialIndex, regionMask
+
+# The synthetic transect runs from (-121.75, 38.05) down to (-122.45, 37.5)
+REGIONS = [
+    ('bbox', -121.97, 37.87, -121.94, 37.9),  # a short stretch
+    ('bbox', -122.3, 37.55, -122.1, 37.75),
+    ('bbox', -123.0, 37.0, -121.0, 39.0),  # everything, plain scan
+    ('bbox', -120.0, 36.0, -119.0, 37.0),  # nothing
+    ('polygon', ((-122.0, 37.95), (-121.9, 37.85), (-122.05, 37.8), (-122.1, 37.9))),
+    ('polygon', ((-122.25, 37.7), (-122.15, 37.7), (-122.25, 37.6))),
+]
+
+@pytest.fixture(scope='module')
+def index(store):
+    return SpatialIndex(store.df)
+
+
+@pytest.mark.parametrize('region', REGIONS)
+def test_query_matches_scan(store, index, region):
+    expected = np.flatnonzero(regionMask(region, store.df.lon.to_numpy(), store.df.lat.to_numpy()))
+    np.testing.assert_array_equal(index.query(region), expected)
+
+
+@pytest.mark.parametrize('region', REGIONS)
+def test_within_matches_scan(store, index, region):
+    mask = regionMask(region, store.df.lon.to_numpy(), store.df.lat.to_numpy())
+    date_rows = store.rows(store.dates[2])
+    np.testing.assert_array_equal(index.within(region, date_rows), np.flatnonzero(mask[date_rows]) + date_rows.start)
+    rows = np.random.default_rng(0).choice(len(store), 20_000, replace=False)
+    np.testing.assert_array_equal(index.within(region, rows), rows[mask[rows]])
@@ -0,0 +1,188 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class FigureCache:
+    """Bounded LRU cache for callback outputs, keyed on normalized filter state.
+
+    Values are pickled on insert so the in-memory tier can be bounded by both
+    entry count and byte size. If `disk_path` is set, entries are also written
+    to a SQLite file that survives restarts and is shared by every worker
+    pointing at the same path.
+    """
+
+    def __init__(self, max_entries: int=256, max_bytes: int=256 * 2**20,
+                 disk_path: str=None, disk_max_bytes: int=2 * 2**30):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self.counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        self.disk_path = disk_path
+        self._disk = self._connect() if disk_path else None
+        # Forked children (e.g. background callback jobs) must not reuse the parent's locks or connection,
+        # and a fork waits for disk operations in progress so no child inherits SQLite mid-transaction
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(before=lambda: self._disk_lock.acquire(),
+                                after_in_parent=lambda: self._disk_lock.release(),
+                                after_in_child=self._afterFork)
+
+    def _connect(self) -> sqlite3.Connection:
+        disk = sqlite3.connect(self.disk_path, timeout=30, check_same_thread=False, isolation_level=None)
+        disk.execute('PRAGMA journal_mode=WAL')
+        disk.execute('CREATE TABLE IF NOT EXISTS cache '
+                     '(key TEXT PRIMARY KEY, value BLOB, size INTEGER, atime REAL)')
+        return disk
+
+    def _afterFork(self):
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        if self._disk is not None:
+            # The inherited connection is kept, never closed, so the child can't touch the parent's locks
+            self._inherited, self._disk = self._disk, self._connect()
+
+    @staticmethod
+    def _digest(key) -> str:
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get(self, key):
+        """Cached value for key, or None on a miss"""
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return pickle.loads(blob)
+
+        blob = self._diskGet(key)
+        if blob is not None:
+            with self._lock:
+                self.counters['disk_hits'] += 1
+                self._memPut(key, blob)
+            return pickle.loads(blob)
+
+        with self._lock:
+            self.counters['misses'] += 1
+        return None
+
+    def put(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._memPut(key, blob)
+        self._diskPut(key, blob)
+
+    def getOrBuild(self, key, builder, *args, **kwargs):
+        """Return the cached value for key, building and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = builder(*args, **kwargs)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.execute('DELETE FROM cache')
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), bytes=self._bytes)
+
+    # In-memory tier, caller holds the lock
+    def _memPut(self, key, blob: bytes):
+        if len(blob) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._entries[key] = blob
+        self._bytes += len(blob)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.counters['evictions'] += 1
+
+    # Disk tier
+    def _diskGet(self, key):
+        if self._disk is None:
+            return None
+        digest = self._digest(key)
+        with self._disk_lock:
+            row = self._disk.execute('SELECT value FROM cache WHERE key = ?', (digest,)).fetchone()
+            if row is None:
+                return None
+            self._disk.execute('UPDATE cache SET atime = ? WHERE key = ?', (time.time(), digest))
+        return row[0]
+
+    def _diskPut(self, key, blob: bytes):
+        if self._disk is None:
+            return
+        with self._disk_lock:
+            self._disk.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)',
+                               (self._digest(key), blob, len(blob), time.time()))
+            total = self._disk.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+            if total > self.disk_max_bytes:
+                # Drop least recently used rows until back under budget
+                self._disk.execute(
+                    'DELETE FROM cache WHERE key IN (SELECT key FROM '
+                    '(SELECT key, SUM(size) OVER (ORDER BY atime DESC) AS running FROM cache) '
+                    'WHERE running > ?)', (self.disk_max_bytes,))
+
+
+def jobCache(path: str):
+    """diskcache.Cache for Dash background jobs, safe to fork jobs from a threaded worker.
+
+    Every operation holds a lock that a fork of this process also takes, so
+    a job is never forked while another request thread is inside SQLite. A
+    child inheriting SQLite's lock state mid-transaction sees the database
+    locked by a connection that no longer exists, and times out.
+    """
+    import diskcache
+
+    class JobCache(diskcache.Cache):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._fork_lock = threading.RLock()
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(before=lambda: self._fork_lock.acquire(),
+                                    after_in_parent=lambda: self._fork_lock.release(),
+                                    after_in_child=self._afterFork)
+
+        def _afterFork(self):
+            self._fork_lock = threading.RLock()
+
+        def get(self, *args, **kwargs):
+            with self._fork_lock:
+                return super().get(*args, **kwargs)
+
+        def set(self, *args, **kwargs):
+            with self._fork_lock:
+                return super().set(*args, **kwargs)
+
+        def delete(self, *args, **kwargs):
+            with self._fork_lock:
+                return super().delete(*args, **kwargs)
+
+        def touch(self, *args, **kwargs):
+            with self._fork_lock:
+                return super().touch(*args, **kwargs)
+
+        @contextmanager
+        def transact(self, retry: bool=False):
+            with self._fork_lock, super().transact(retry):
+                yield
+
+    return JobCache(path)
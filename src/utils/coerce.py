@@ -0,0 +1,131 @@
+import threading
+import pandas as pd
+import numpy as np
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320
+
+
+class ReferenceLine:
+    """Reference transect indexed for snapping samples onto it.
+
+    Vertices are projected to a local planar frame (km) and put in a KD-tree,
+    with the cumulative along-track distance of each vertex, so projecting a
+    batch of samples is one vectorized tree query plus a few segment tests.
+    A line with fewer than two distinct vertices projects everything to NaN.
+    """
+
+    def __init__(self, refline: pd.DataFrame, k: int=3):
+        from scipy.spatial import cKDTree # only needed once coercion is first used
+        if 'datetime' in refline:
+            refline = refline.sort_values('datetime', kind='stable')
+        lat = refline.lat.to_numpy(dtype=float)
+        lon = refline.lon.to_numpy(dtype=float)
+        keep = ~(np.isnan(lat) | np.isnan(lon))
+        lat, lon = lat[keep], lon[keep]
+        self.lat0, self.lon0 = (lat.mean(), lon.mean()) if len(lat) else (0.0, 0.0)
+        xy = self.toPlanar(lat, lon)
+
+        # Drop repeated vertices so every segment has a length
+        step = np.r_[True, np.any(np.diff(xy, axis=0) != 0, axis=1)][:len(xy)]
+        self.xy = xy[step]
+        self.seg = np.diff(self.xy, axis=0)
+        self.seg_len2 = (self.seg**2).sum(axis=1)
+        self.along = np.r_[0, np.cumsum(np.sqrt(self.seg_len2))]
+        self.tree = cKDTree(self.xy) if len(self.seg) else None
+        self.k = min(k, len(self.xy))
+
+    def toPlanar(self, lat, lon) -> np.ndarray:
+        return np.column_stack(((lon - self.lon0) * KM_PER_DEG_LON * np.cos(np.radians(self.lat0)),
+                                (lat - self.lat0) * KM_PER_DEG_LAT))
+
+    def fromPlanar(self, xy: np.ndarray) -> tuple:
+        lat = xy[:, 1] / KM_PER_DEG_LAT + self.lat0
+        lon = xy[:, 0] / (KM_PER_DEG_LON * np.cos(np.radians(self.lat0))) + self.lon0
+        return lat, lon
+
+    def project(self, lat, lon) -> dict:
+        """Snapped lat/lon, along-track distance and offset (km) of each sample"""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        out = {name: np.full(len(lat), np.nan) for name in ('lat', 'lon', 'along_km', 'offset_km')}
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        if not valid.any() or len(self.seg) == 0:
+            return out
+        p = self.toPlanar(lat[valid], lon[valid])
+
+        # Candidate segments: those on either side of the k nearest vertices
+        _, near = self.tree.query(p, k=self.k)
+        near = near.reshape(len(p), -1)
+        cand = np.clip(np.concatenate([near - 1, near], axis=1), 0, len(self.seg) - 1)
+
+        a = self.xy[cand]
+        d = self.seg[cand]
+        len2 = self.seg_len2[cand]
+        t = np.clip(((p[:, None, :] - a) * d).sum(axis=2) / np.where(len2 > 0, len2, 1), 0, 1)
+        q = a + t[..., None] * d
+        dist2 = ((p[:, None, :] - q)**2).sum(axis=2)
+        best = dist2.argmin(axis=1)
+        rows = np.arange(len(p))
+        seg, t_best = cand[rows, best], t[rows, best]
+
+        snapped = q[rows, best]
+        out['lat'][valid], out['lon'][valid] = self.fromPlanar(snapped)
+        out['along_km'][valid] = self.along[seg] + t_best * np.sqrt(self.seg_len2[seg])
+        out['offset_km'][valid] = np.sqrt(dist2[rows, best])
+        return out
+
+
+class CoercionCache:
+    """Coerced positions cached per transect file, valid across store rebuilds.
+
+    The ReferenceLine is built from the refline rows on first use.
+    """
+
+    def __init__(self, refline: pd.DataFrame):
+        self.refline = refline
+        self.files = {}
+        self._ref = None
+        self._lock = threading.Lock()
+
+    @property
+    def ref(self) -> ReferenceLine:
+        if self._ref is None:
+            with self._lock:
+                if self._ref is None:
+                    self._ref = ReferenceLine(self.refline)
+        return self._ref
+
+    def fileCoercion(self, store, file: str) -> dict:
+        coerced = self.files.get(file)
+        if coerced is None:
+            rows = store.fileRows(file)
+            coerced = self.ref.project(store.df.lat.to_numpy()[rows], store.df.lon.to_numpy()[rows])
+            with self._lock:
+                self.files[file] = coerced
+        return coerced
+
+    def forget(self, files):
+        """Drop cached results of re-ingested files"""
+        with self._lock:
+            for file in files:
+                self.files.pop(file, None)
+
+    def coerce(self, store, rows) -> dict:
+        """Coerced lat/lon/along_km/offset_km for the given store rows"""
+        rows = np.arange(len(store))[rows] if isinstance(rows, slice) else np.asarray(rows)
+        files = store.df.file.to_numpy()[rows]
+        out = {name: np.full(len(rows), np.nan) for name in ('lat', 'lon', 'along_km', 'offset_km')}
+        for file in pd.unique(files):
+            mask = files == file
+            coerced = self.fileCoercion(store, file)
+            # Position of each selected row within its file's rows
+            pos = np.searchsorted(store.fileRows(file), rows[mask])
+            for name in out:
+                out[name][mask] = coerced[name][pos]
+        return out
+
+    def frame(self, store, rows, frame: pd.DataFrame) -> pd.DataFrame:
+        """Selection frame with positions snapped to the reference line"""
+        coerced = self.coerce(store, rows)
+        return frame.assign(lat=coerced['lat'], lon=coerced['lon'], along_track=coerced['along_km'])
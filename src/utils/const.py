@@ -1,3 +1,5 @@
+import os
+
 STATION_IDS = [36, 35, 34, 33, 32, 31, 30, 29.5, 29, 28, 27, 26,
               25, 24, 23, 22, 21, 20, 18, 17, 16, 15, 14, 13,
               12, 11, 10, 9, 8, 7, 6, 5, 4, 3, 2, 649, 653, 657]
@@ -14,6 +16,62 @@ USGS_HREF = 'https://www.usgs.gov'
 
 REF_FILE = '14322dat.txt'
 
+# Dataset location, a .arrow/.feather file built by convertToArrow is memory mapped
+DATA_PATH = os.environ.get('PETERSON_DATA', 'src/assets/data/PETERSON_FINAL.parquet')
+STATIONS_PATH = 'src/assets/data/stationlocations.parquet'
+# Startup artifact built by `python -m utils.startup`, ignored if missing or built from other data
+STARTUP_PATH = os.environ.get('PETERSON_STARTUP', DATA_PATH + '.startup')
+# Seconds a callback waits for the background data load before giving up
+LOAD_TIMEOUT = 300
+# Shared memory segment holding the prepared dataset, set by serve.py for its workers
+SHARED_DATA = os.environ.get('PETERSON_SHARED_DATA')
+
+# Streaming ingest: committed date-partitioned fragments, and an optional inbox of raw files
+INGEST_DIR = os.environ.get('PETERSON_INGEST_DIR')
+INGEST_INBOX = os.environ.get('PETERSON_INGEST_INBOX')
+INGEST_INTERVAL = 30
+
+# Raw flowthrough header names (lowercased) mapped onto the app schema
+RAW_COLUMN_MAP = {
+    'latitude': 'lat', 'longitude': 'lon', 'long': 'lon',
+    'station': 'station_id', 'station_number': 'station_id',
+    'distance': 'd_from_start', 'dist': 'd_from_start',
+    'chl': 'chlor', 'chlorophyll': 'chlor', 'fluor': 'chlor',
+    'sal': 'salinity', 'turb': 'turbidity', 'water temp': 'water_temp', 'wtemp': 'water_temp',
+    'bow temp': 'bow_temp', 'btemp': 'bow_temp', 'air temp': 'air_temp', 'atemp': 'air_temp',
+    'date_time': 'datetime', 'timestamp': 'datetime',
+}
+
+# Columns the app reads from the dataset
+DATA_COLUMNS = ['file', 'datetime', 'lat', 'lon', 'station_id', 'd_from_start', 'chlor', 'salinity',
+                'turbidity', 'depth', 'water_temp', 'bow_temp', 'air_temp', 'dataset']
+
+MAP_CENTER = {'lat': 37.82, 'lon': -121.75}
+MAP_ZOOM = 9
+
+# Max points sent to the transect map before level-of-detail aggregation kicks in
+LOD_MAX_POINTS = 20000
+
+# Send figure arrays as base64 float32 typed arrays instead of JSON numbers (needs Dash >= 2.15)
+BINARY_TRANSPORT = os.environ.get('PETERSON_BINARY_TRANSPORT', '0') == '1'
+
+# Default sample when no date or station is selected, its draw order is precomputed at startup
+SAMPLE_SIZE = 1000
+SAMPLE_SEED = 12345
+SAMPLE_MODE = 'uniform'
+
+# Quiet time after the last map pan/zoom/selection before the statistics follow the map region
+SPATIAL_DEBOUNCE_MS = 400
+
+# Points per statistics subplot after resampling, re-aggregated on zoom
+STATS_MAX_POINTS = 2000
+
+# Statistics plot x axis, distance along each run or along the reference line when coerced
+DISTANCE_AXIS_TITLES = {
+    'd_from_start': 'Distance from Station 36 (km)',
+    'along_track': 'Distance along reference line (km)',
+}
+
 PARAM_NAME_UNIT_DICT = {
     "chlor": ("Chlorophyll", '(ug/l)'),
     "salinity": ("Salinity", '(ppt)'),
@@ -22,3 +80,24 @@ PARAM_NAME_UNIT_DICT = {
     "water_temp": ('Water Temperature', "(C)"),
     'air_temp': ('Air Temprature', "(C)")
 }
+
+# Figure/table cache. Set PETERSON_CACHE_DIR to share a disk tier across workers
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_BYTES = 256 * 2**20
+CACHE_DIR = os.environ.get('PETERSON_CACHE_DIR')
+# Bump when cached figures or tables change, disk tier files of older versions are then ignored
+CACHE_VERSION = 3
+
+# Per-callback stage timings, /metrics and Server-Timing headers. Off unless PETERSON_PROFILE=1
+PROFILE = os.environ.get('PETERSON_PROFILE', '0') == '1'
+# Dump 'pyinstrument' or 'cprofile' profiles of callbacks slower than PROFILE_SLOW_MS
+PROFILER = os.environ.get('PETERSON_PROFILER', '')
+PROFILE_SLOW_MS = float(os.environ.get('PETERSON_PROFILE_SLOW_MS', 500))
+PROFILE_RATE = float(os.environ.get('PETERSON_PROFILE_RATE', 1.0)) # fraction of callbacks profiled
+PROFILE_DIR = os.environ.get('PETERSON_PROFILE_DIR', 'profiles')
+
+# Run the slow figure callbacks as Dash background jobs (needs dash[diskcache]), off unless set.
+# A job is terminated when its callback is triggered again, e.g. by a filter change mid-render.
+# Only cache misses start a job, whose result is kept for the workers if PETERSON_CACHE_DIR is set
+BACKGROUND_DIR = os.environ.get('PETERSON_BACKGROUND_DIR')
+BACKGROUND_INTERVAL = 250 # ms between result polls of a running job
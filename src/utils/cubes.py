@@ -0,0 +1,138 @@
+import math
+from collections import defaultdict
+import pandas as pd
+import numpy as np
+
+CUBE_PARAMS = ['datetime', 'chlor', 'salinity', 'turbidity', 'depth', 'water_temp']
+
+
+class TDigest:
+    """Mergeable quantile sketch (merging t-digest with the k1 scale function)"""
+
+    def __init__(self, means=None, weights=None, compression: int=100):
+        self.means = np.empty(0) if means is None else np.asarray(means, dtype=float)
+        self.weights = np.empty(0) if weights is None else np.asarray(weights, dtype=float)
+        self.compression = compression
+
+    @classmethod
+    def fromValues(cls, values, compression: int=100) -> 'TDigest':
+        values = np.sort(np.asarray(values, dtype=float))
+        return cls(values, np.ones(len(values)), compression)._compress()
+
+    @classmethod
+    def merge(cls, digests, compression: int=100) -> 'TDigest':
+        digests = [d for d in digests if len(d.means)]
+        if not digests:
+            return cls(compression=compression)
+        means = np.concatenate([d.means for d in digests])
+        weights = np.concatenate([d.weights for d in digests])
+        order = np.argsort(means, kind='stable')
+        return cls(means[order], weights[order], compression)._compress()
+
+    def _compress(self) -> 'TDigest':
+        if len(self.means) <= self.compression:
+            return self
+        # Centroids sharing a unit interval of k(q) are merged, keeping tails fine
+        total = self.weights.sum()
+        q = np.cumsum(self.weights) / total
+        k = self.compression / (2 * math.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1))
+        group = np.floor(k - k.min()).astype(np.int64)
+        _, group = np.unique(group, return_inverse=True)
+        weights = np.bincount(group, weights=self.weights)
+        self.means = np.bincount(group, weights=self.means * self.weights) / weights
+        self.weights = weights
+        return self
+
+    def quantile(self, q: float, vmin: float, vmax: float) -> float:
+        if not len(self.means):
+            return np.nan
+        centers = np.cumsum(self.weights) - self.weights / 2
+        total = self.weights.sum()
+        return float(np.interp(q * total, np.r_[0, centers, total], np.r_[vmin, self.means, vmax]))
+
+
+class StatsCube:
+    """Precomputed per-(date, station_id, file) aggregates for the metadata tables.
+
+    Each partial holds count, min, max and a t-digest per parameter, so the
+    table for any date/station selection is a merge of a few partials rather
+    than a scan of the selected rows. New transect files only add partials.
+    """
+
+    def __init__(self, compression: int=100):
+        self.compression = compression
+        self.partials = {}
+        self.by_date = defaultdict(set)
+        self.by_station = defaultdict(set)
+
+    @classmethod
+    def fromFrame(cls, df: pd.DataFrame, compression: int=100) -> 'StatsCube':
+        cube = cls(compression)
+        cube.update(df)
+        return cube
+
+    def copy(self) -> 'StatsCube':
+        """Independent cube sharing the (immutable) partials"""
+        cube = StatsCube(self.compression)
+        cube.partials = dict(self.partials)
+        cube.by_date = defaultdict(set, {k: set(v) for k, v in self.by_date.items()})
+        cube.by_station = defaultdict(set, {k: set(v) for k, v in self.by_station.items()})
+        return cube
+
+    def update(self, df: pd.DataFrame):
+        """Add (or replace) partials for the files present in df"""
+        files = set(df.file.unique())
+        for key in [k for k in self.partials if k[2] in files]:
+            del self.partials[key]
+            self.by_date[key[0]].discard(key)
+            self.by_station[key[1]].discard(key)
+        dates = df.datetime.dt.normalize().dt.strftime('%Y-%m-%d')
+        values = {p: (df[p].astype('int64') if p == 'datetime' else df[p]).to_numpy(dtype=float)
+                  for p in CUBE_PARAMS}
+        groups = df.groupby([dates, df.station_id, df.file], sort=False, dropna=False).indices
+        for key, rows in groups.items():
+            self.partials[key] = {p: self._summarize(values[p][rows]) for p in CUBE_PARAMS}
+            self.by_date[key[0]].add(key)
+            self.by_station[key[1]].add(key)
+
+    def _summarize(self, vals: np.ndarray) -> tuple:
+        vals = vals[~np.isnan(vals)]
+        if not len(vals):
+            return 0, np.nan, np.nan, TDigest(compression=self.compression)
+        return len(vals), vals.min(), vals.max(), TDigest.fromValues(vals, self.compression)
+
+    def keys(self, date: str=None, stations: list=None) -> set:
+        """Partials covering a survey date and/or list of stations"""
+        if stations:
+            keys = set().union(*(self.by_station.get(sta, ()) for sta in stations))
+            return {k for k in keys if k[0] == date} if date else keys
+        if date:
+            return set(self.by_date.get(date, ()))
+        return set(self.partials)
+
+    def summary(self, date: str=None, stations: list=None) -> pd.DataFrame:
+        """describe()-like count/min/max/50% per parameter for a selection"""
+        keys = sorted(self.keys(date, stations), key=str)
+        out = []
+        for p in CUBE_PARAMS:
+            stats = [self.partials[k][p] for k in keys if self.partials[k][p][0]]
+            count = sum(s[0] for s in stats)
+            vmin = min((s[1] for s in stats), default=np.nan)
+            vmax = max((s[2] for s in stats), default=np.nan)
+            if p == 'datetime':
+                # Partials are per day, so the median day is exact from their counts
+                days = np.array([pd.Timestamp(k[0]).value for k in keys if self.partials[k][p][0]], dtype=float)
+                order = np.argsort(days, kind='stable')
+                cum = np.cumsum([stats[i][0] for i in order])
+                median = np.nan
+                if count:
+                    # Even counts split across two days average them, like describe()
+                    i = np.searchsorted(cum, count / 2)
+                    j = i + 1 if cum[i] == count / 2 and i + 1 < len(order) else i
+                    median = (days[order[i]] + days[order[j]]) / 2
+                vmin, vmax, median = (pd.Timestamp(int(v)) if count else pd.NaT for v in (vmin, vmax, median))
+            else:
+                median = TDigest.merge([s[3] for s in stats], self.compression).quantile(0.5, vmin, vmax)
+            out.append((p, count, vmin, vmax, median))
+        summary = pd.DataFrame(out, columns=['index', 'count', 'min', 'max', '50%'], dtype=object)
+        return summary.set_index('index').rename_axis(None)
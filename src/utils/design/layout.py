@@ -1,6 +1,5 @@
 from dash import Dash, html, dcc, callback, Output, Input
 import dash_bootstrap_components as dbc
-import dash_mantine_components as dmc
 from datetime import date
 
 from utils.lang.en import *
@@ -1,36 +1,80 @@
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import math
 import numpy as np
 
 from utils.const import *
+from utils.resample import resampleSeries, envelopeError
+from utils.store import TransectStore
 
-def importData(path: str) -> pd.DataFrame:
-    """Import app dataset from either parquet, csv, or xlsx"""
+def importData(path: str, columns: list=None) -> pd.DataFrame:
+    """Import app dataset from either parquet, arrow/feather, csv, or xlsx
+
+    Only `columns` are read. Arrow/feather files are memory mapped, so
+    uncompressed numeric columns are shared between worker processes through
+    the OS page cache.
+    """
     if path.endswith('.parquet'):
-        return pd.read_parquet(path)
+        return pd.read_parquet(path, columns=columns)
+
+    elif path.endswith(('.arrow', '.feather')):
+        import pyarrow.dataset as ds
+        import pyarrow.fs as pafs
+        dataset = ds.dataset(path, format='ipc', filesystem=pafs.LocalFileSystem(use_mmap=True))
+        table = dataset.to_table(columns=columns)
+        # split_blocks keeps single-chunk numeric columns as views of the mapping
+        return table.to_pandas(split_blocks=True)
 
     elif path.endswith('.csv'):
-        return pd.read_csv(path)
+        return pd.read_csv(path, usecols=columns)
     
     elif path.endswith('.xlsx'):
-        return pd.read_excel(path)
+        return pd.read_excel(path, usecols=columns)
     
     else:
         raise Exception("FileError: No suitable dataset found")
-    
+
+def prepareTransects(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalize the transect dataset schema, a no-op on already converted data"""
+    if not pd.api.types.is_datetime64_any_dtype(df.datetime):
+        df['datetime'] = pd.to_datetime(df.datetime)
+    if 'bow_temp' in df and df.water_temp.isna().any():
+        df['water_temp'] = df['water_temp'].combine_first(df['bow_temp'])
+    return df
+
+def convertToArrow(src: str, dst: str):
+    """Write the dataset as an uncompressed, pre-sorted arrow file for memory mapped loading
+
+    The rows are stored in TransectStore order as a single record batch, so the
+    store can use the mapped columns as-is instead of sorting a private copy.
+    NaN gaps are kept as float values rather than nulls (shared.arrowTable),
+    which lets float columns with gaps map without a copy too.
+    """
+    import pyarrow.feather as feather
+    from utils.shared import arrowTable
+    df = TransectStore(prepareTransects(importData(src, columns=DATA_COLUMNS))).df
+    feather.write_feather(arrowTable(df), dst, compression='uncompressed', chunksize=max(len(df), 1))
+
+def mapFontColor(mapTile: str):
+    """Colorbar font color for a map tile, None keeps the plotly default"""
+    return 'lightgrey' if mapTile == 'carto-darkmatter' else None
 
 def createSpatialVis(dfg, stations, refline, param, mapTile, station_t, ref_t, coerce_t) -> go.Figure:
     """Generates the transect visualization"""
-    fig = px.scatter_mapbox(dfg, lat='lat', lon='lon', hover_name=dfg.datetime.dt.date, hover_data={param, 'file', 'dataset'}, color=param,
+    import plotly.express as px # slow to import, deferred until the first map is drawn
+    # Aggregated (level-of-detail) points also carry their cell count and range,
+    # coerced points their distance along the reference line
+    # (sorted so hover columns line up across workers and appended points)
+    hover = sorted({param, 'file', 'dataset'} | {c for c in ('count', f'{param}_min', f'{param}_max', 'along_track') if c in dfg})
+    fig = px.scatter_mapbox(dfg, lat='lat', lon='lon', hover_name=dfg.datetime.dt.date, hover_data=hover, color=param,
                             zoom=3, color_continuous_scale=px.colors.sequential.Viridis, opacity=0.75)
     
     fig = fig.update_layout(
         mapbox_style=mapTile,
         margin={"r": 0, "t": 0, "l": 0, "b": 0},
-        mapbox={'center': {'lat': 37.82, 'lon': -121.75}, 'zoom': 9},
+        mapbox={'center': MAP_CENTER, 'zoom': MAP_ZOOM},
+        uirevision='transect',
         autosize=True,
         paper_bgcolor='#888',
         coloraxis=dict(
@@ -40,21 +84,16 @@ def createSpatialVis(dfg, stations, refline, param, mapTile, station_t, ref_t, c
         font=dict(size=14, weight='bold', family='Segoe UI'))
     
     # Update colorbar font color
-    if mapTile == 'carto-darkmatter':
-        fig = fig.update_layout(
-            font=dict(size=14, weight='bold', color='lightgrey'))
-
-    # Toggle refline
-    if ref_t == [0, 1]:
-        fig3 = px.scatter_mapbox(refline, lat='lat', lon='lon', hover_name=refline.name, color_discrete_sequence=['fuchsia'])
-        fig3 = fig3.update_traces(marker={'size': 4})
-        fig = fig.add_trace(fig3.data[0])
-
-        # Toggle stations
-    if station_t == [0, 1]:
-        fig2 = px.scatter_mapbox(stations, lat='lat', lon='lon', hover_name=stations.Station_Number, color_discrete_sequence=['fuchsia'])
-        fig2 = fig2.update_traces(marker={'size': 15})
-        fig = fig.add_trace(fig2.data[0])
+    fig = fig.update_layout(font=dict(color=mapFontColor(mapTile)))
+
+    # Overlays are always present and only toggled visible so they can be patched in place
+    fig3 = px.scatter_mapbox(refline, lat='lat', lon='lon', hover_name=refline.name, color_discrete_sequence=['fuchsia'])
+    fig3 = fig3.update_traces(marker={'size': 4}, visible=ref_t == [0, 1])
+    fig = fig.add_trace(fig3.data[0])
+
+    fig2 = px.scatter_mapbox(stations, lat='lat', lon='lon', hover_name=stations.Station_Number, color_discrete_sequence=['fuchsia'])
+    fig2 = fig2.update_traces(marker={'size': 15}, visible=station_t == [0, 1])
+    fig = fig.add_trace(fig2.data[0])
 
     return fig
 
@@ -62,7 +101,11 @@ def createMetadataTables(dfmd: pd.DataFrame) -> pd.DataFrame:
     """Process and format data for spatial plot metadata tables"""
     keepcol = ['datetime', 'chlor', 'salinity', 'turbidity', 'depth', 'water_temp']
     dfmd = dfmd[keepcol]
-    dfmd = dfmd.describe().transpose()[['count', 'min', 'max', '50%']].reset_index(names='Parameter')
+    return formatMetadataTable(dfmd.describe().transpose())
+
+def formatMetadataTable(summary: pd.DataFrame) -> pd.DataFrame:
+    """Format a describe()-like summary (datetime row first) for the metadata tables"""
+    dfmd = summary[['count', 'min', 'max', '50%']].reset_index(names='Parameter')
     dfmd.columns = [col.title() for col in dfmd.columns]
     dfmd['Parameter'] = dfmd['Parameter'].replace('_', ' ').str.title()
     dfmd = dfmd.round(3)
@@ -72,30 +115,69 @@ def createMetadataTables(dfmd: pd.DataFrame) -> pd.DataFrame:
     dfmd.at[0, '50%'] = dfmd.at[0, '50%'].date()
     return dfmd
 
-def createStatisticsPlot(dfg: pd.DataFrame, color: str="chlor") -> go.Figure:
-    """Generate the statistical visualizations"""
+def statisticsSnapshot(dfg: pd.DataFrame, color: str, x_col: str='d_from_start') -> dict:
+    """Columnar numpy snapshot of the statistics plot columns, the distance axis under 'x'"""
+    snap = {col: dfg[col].to_numpy(dtype=float) for col in {*PARAMS_TO_PLOT, color}}
+    snap['x'] = dfg[x_col].to_numpy(dtype=float)
+    snap['x_col'] = x_col
+    return snap
+
+def statisticsPoints(snap: dict, param: str, color: str, n_out: int=None, x_range: tuple=None,
+                     method: str='minmaxlttb') -> tuple:
+    """Resampled (x, y, color) arrays for one statistics subplot, drawn in ascending y"""
+    x, y = snap['x'], snap[param]
+    if n_out is None and x_range is None:
+        # Full resolution only needs the draw order, NaN sorts last and is dropped
+        kept = np.argsort(y)[:np.count_nonzero(~np.isnan(y))]
+    else:
+        # One distance sort per snapshot, shared by every subplot and zoom
+        if 'order' not in snap:
+            snap['order'] = np.argsort(x, kind='stable')
+        kept = resampleSeries(x, y, n_out, x_range, method, order=snap['order'])
+        kept = kept[np.argsort(y[kept])]
+    return x[kept], y[kept], snap[color][kept], kept
+
+def createStatisticsPlot(dfg, color: str="chlor", n_out: int=None, parity: bool=False) -> go.Figure:
+    """Generate the statistical visualizations, resampled to n_out points per subplot
+
+    Accepts the selection frame or a snapshot from statisticsSnapshot.
+    """
+    snap = dfg if isinstance(dfg, dict) else statisticsSnapshot(dfg, color)
+
     # Dynamically generate subplot layout based on num params
     n_rows = math.ceil(len(PARAMS_TO_PLOT) / 3)
     n_cols = min(len(PARAMS_TO_PLOT), 3)
-    PARAMS_TO_PLOT_rs = np.array(PARAMS_TO_PLOT).reshape(n_rows, n_cols)
     titles = [t[0] + ' ' + t[1] for t in PARAM_NAME_UNIT_DICT.values()]
 
     fig = make_subplots(rows=n_rows, cols=n_cols, start_cell='top-left',
                         subplot_titles=titles)
 
-    for i in range(1, n_rows + 1):
-        for j in range(1, n_cols + 1):
-            dfg = dfg.sort_values(PARAMS_TO_PLOT_rs[i-1][j-1], ascending=True)
-            fig.add_trace(go.Scatter(x=dfg.d_from_start, y=dfg[PARAMS_TO_PLOT_rs[i-1][j-1]], mode='markers',
-                marker=dict(size=4, 
-                            color=dfg[color], 
-                            showscale=True,
-                            colorscale='viridis',
-                            colorbar=dict(title=f'{PARAM_NAME_UNIT_DICT[color][0]} {PARAM_NAME_UNIT_DICT[color][1]}',
-                                          thickness=20))), 
-                            row=i, col=j)
+    # One shared color axis instead of a colorbar per subplot
+    envelopes = []
+    for k, param in enumerate(PARAMS_TO_PLOT):
+        i, j = divmod(k, n_cols)
+        x, y, c, kept = statisticsPoints(snap, param, color, n_out)
+        fig.add_trace(go.Scattergl(x=x, y=y, mode='markers',
+                                   marker=dict(size=4, color=c, coloraxis='coloraxis')),
+                      row=i + 1, col=j + 1)
+        if parity:
+            envelopes.append((i + 1, j + 1, envelopeError(snap['x'], snap[param], kept)))
+
+    # Parity mode: full-data envelope behind each subplot and the error in its title
+    for k, (i, j, err) in enumerate(envelopes):
+        if err['bins'] is not None:
+            edges, lo, hi = err['bins']
+            mid = (edges[:-1] + edges[1:]) / 2
+            for bound in (lo, hi):
+                fig.add_trace(go.Scattergl(x=mid, y=bound, mode='lines', hoverinfo='skip',
+                                           line=dict(color='grey', width=1)), row=i, col=j)
+        fig.layout.annotations[k].text += (f"<br><sup>{err['shown']:,} of {err['full']:,} pts, "
+                                           f"max envelope error {err['max_err']:.3g} ({err['rel_err']:.1%})</sup>")
 
     fig.update_layout(
+        coloraxis=dict(colorscale='viridis',
+                       colorbar=dict(title=f'{PARAM_NAME_UNIT_DICT[color][0]} {PARAM_NAME_UNIT_DICT[color][1]}',
+                                     thickness=20)),
         showlegend=False,
         plot_bgcolor='#F9F9F9',
         font=dict(size=12, family='Segoe UI')
@@ -103,11 +185,63 @@ def createStatisticsPlot(dfg: pd.DataFrame, color: str="chlor") -> go.Figure:
     fig.update_xaxes(
         linecolor='black',
         gridcolor='lightgrey',
-        title_text='Distance from Station 36 (km)'
+        title_text=DISTANCE_AXIS_TITLES[snap['x_col']]
     )
     fig.update_yaxes(
         linecolor='black',
         gridcolor='lightgrey'
     )
 
-    return fig
\ No newline at end of file
+    return fig
+
+def createTrendHeatmap(heat: pd.DataFrame, param: str) -> go.Figure:
+    """Station by month/season heatmap of a rollup statistic"""
+    # Stations from the head of the transect down
+    order = [s for s in STATION_IDS if s in heat.index] + [s for s in heat.index if s not in STATION_IDS]
+    heat = heat.reindex(order)
+    fig = go.Figure(go.Heatmap(z=heat.to_numpy(dtype=float), x=heat.columns, y=[str(s) for s in heat.index],
+                               colorscale='viridis', hoverongaps=False,
+                               colorbar=dict(title=f'{PARAM_NAME_UNIT_DICT[param][0]} {PARAM_NAME_UNIT_DICT[param][1]}',
+                                             thickness=20)))
+    fig.update_layout(
+        plot_bgcolor='#F9F9F9',
+        margin={"r": 10, "t": 10, "l": 10, "b": 10},
+        font=dict(size=12, family='Segoe UI'),
+        yaxis=dict(title_text='Station', type='category', autorange='reversed'),
+        xaxis=dict(title_text='Date')
+    )
+    return fig
+
+def createTrendPlot(trend: pd.DataFrame, param: str) -> go.Figure:
+    """Trend lines of a rollup: one per station, or a single bay-wide line"""
+    fig = go.Figure()
+    if 'station_id' in trend.index.names:
+        from plotly.colors import qualitative
+        palette = qualitative.Plotly
+        for k, (sta, dft) in enumerate(trend.groupby(level='station_id')):
+            dft = dft.droplevel('station_id')
+            color = palette[k % len(palette)]
+            # Interquartile band behind each station's mean
+            fig.add_trace(go.Scatter(x=np.r_[dft.index, dft.index[::-1]], y=np.r_[dft.q75, dft.q25[::-1]],
+                                     fill='toself', fillcolor=color, mode='none', opacity=0.2, hoverinfo='skip', showlegend=False,
+                                     legendgroup=str(sta)))
+            fig.add_trace(go.Scatter(x=dft.index, y=dft['mean'], mode='lines+markers', name=f'Station {sta}', line_color=color,
+                                     legendgroup=str(sta), customdata=np.c_[dft['count'], dft.q50],
+                                     hovertemplate='%{x|%Y-%m}: %{y:.3g} (median %{customdata[1]:.3g}, n=%{customdata[0]})'))
+    else:
+        fig.add_trace(go.Scatter(x=trend.index, y=trend['mean'], mode='lines+markers', name='All stations',
+                                 customdata=trend['count'], hovertemplate='%{x|%Y-%m}: %{y:.3g} (n=%{customdata})'))
+    fig.update_layout(
+        plot_bgcolor='#F9F9F9',
+        margin={"r": 10, "t": 10, "l": 10, "b": 10},
+        font=dict(size=12, family='Segoe UI'),
+        yaxis=dict(title_text=f'{PARAM_NAME_UNIT_DICT[param][0]} {PARAM_NAME_UNIT_DICT[param][1]}',
+                   linecolor='black', gridcolor='lightgrey'),
+        xaxis=dict(title_text='Date', linecolor='black', gridcolor='lightgrey')
+    )
+    return fig
+
+if __name__ == '__main__':
+    import sys
+    # From src/: python -m utils.func <src.parquet> <dst.arrow>
+    convertToArrow(sys.argv[1], sys.argv[2])
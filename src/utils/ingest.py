@@ -0,0 +1,213 @@
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+import pandas as pd
+import numpy as np
+
+from utils.const import *
+from utils.func import importData, prepareTransects
+
+
+def sniffSeparator(path: str) -> str:
+    """Delimiter of a raw flowthrough file from its header line"""
+    with open(path, 'r', errors='replace') as f:
+        header = f.readline()
+    if ',' in header:
+        return ','
+    if '\t' in header:
+        return '\t'
+    return r'\s+'
+
+
+def normalizeChunk(chunk: pd.DataFrame, file: str, dataset: str) -> pd.DataFrame:
+    """Map a raw chunk onto the app schema (DATA_COLUMNS)"""
+    chunk = chunk.rename(columns=lambda c: str(c).strip().lower())
+    chunk = chunk.rename(columns=RAW_COLUMN_MAP)
+    if 'datetime' not in chunk and {'date', 'time'} <= set(chunk.columns):
+        chunk['datetime'] = chunk['date'].astype(str) + ' ' + chunk['time'].astype(str)
+    chunk['datetime'] = pd.to_datetime(chunk['datetime'], errors='coerce')
+    chunk['file'] = file
+    chunk['dataset'] = dataset
+    for col in DATA_COLUMNS:
+        if col not in chunk:
+            chunk[col] = np.nan
+    chunk = chunk[DATA_COLUMNS].dropna(subset=['datetime'])
+    return prepareTransects(chunk)
+
+
+def readFlowthrough(path: str, chunksize: int=100_000, dataset: str='flowthrough'):
+    """Parse a raw flowthrough file (.001 / dat.txt) in normalized chunks
+
+    Raw files are delimited text with a header row; column names are matched
+    case-insensitively through RAW_COLUMN_MAP.
+    """
+    file = os.path.basename(path)
+    reader = pd.read_csv(path, sep=sniffSeparator(path), chunksize=chunksize,
+                         skipinitialspace=True, on_bad_lines='skip')
+    for chunk in reader:
+        yield normalizeChunk(chunk, file, dataset)
+
+
+def manifestFile(manifest: str) -> tuple:
+    """Transect file and commit stamp of a manifest named {file}.{stamp}.json"""
+    file, stamp, _ = os.path.basename(manifest).rsplit('.', 2)
+    return file, int(stamp)
+
+
+def ingestFile(path: str, root: str, chunksize: int=100_000) -> str:
+    """Write a raw file as date-partitioned parquet fragments and commit a manifest
+
+    Fragments land in root/date=YYYY-MM-DD/. They only become visible to
+    readers once the manifest listing them is written to root/_manifests, so a
+    file is never loaded half-ingested. Every ingest gets new fragment and
+    manifest names, so re-ingesting a file commits a newer manifest that
+    supersedes the old one, whose manifest and fragments are then removed.
+    """
+    file = os.path.basename(path)
+    stamp = time.time_ns()
+    fragments = []
+    for i, chunk in enumerate(readFlowthrough(path, chunksize)):
+        days = chunk.datetime.dt.strftime('%Y-%m-%d')
+        for day, part in chunk.groupby(days, sort=False):
+            frag = os.path.join(root, f'date={day}', f'{file}.{stamp}.{i:05d}.parquet')
+            _atomicWrite(frag, lambda tmp: part.to_parquet(tmp, index=False))
+            fragments.append(os.path.relpath(frag, root))
+
+    def writeManifest(tmp):
+        with open(tmp, 'w') as f:
+            json.dump({'file': file, 'fragments': fragments}, f)
+
+    manifest = os.path.join(root, '_manifests', f'{file}.{stamp}.json')
+    _atomicWrite(manifest, writeManifest)
+    _removeSuperseded(root, file, stamp, set(fragments))
+    return manifest
+
+
+def _removeSuperseded(root: str, file: str, stamp: int, keep: set):
+    """Delete older manifests of file, then the fragments only they listed"""
+    for old in glob.glob(os.path.join(root, '_manifests', f'{glob.escape(file)}.*.json')):
+        if manifestFile(old)[1] >= stamp:
+            continue
+        try:
+            with open(old) as f:
+                fragments = json.load(f)['fragments']
+            os.remove(old)
+        except FileNotFoundError: # another ingest of the same file got there first
+            continue
+        for frag in set(fragments) - keep:
+            try:
+                os.remove(os.path.join(root, frag))
+            except FileNotFoundError:
+                pass
+
+
+def claimInbox(inbox: str) -> list:
+    """Move new raw files from the inbox into inbox/processing, one claimer per file"""
+    processing = os.path.join(inbox, 'processing')
+    os.makedirs(processing, exist_ok=True)
+    claimed = []
+    for path in sorted(glob.glob(os.path.join(inbox, '*'))):
+        if not os.path.isfile(path):
+            continue
+        dst = os.path.join(processing, os.path.basename(path))
+        try:
+            os.rename(path, dst) # atomic, so workers sharing an inbox never double-ingest
+        except OSError:
+            continue
+        claimed.append(dst)
+    return claimed
+
+
+def readManifests(root: str, seen: set) -> tuple:
+    """Data and names of committed manifests not in seen
+
+    Only the latest manifest of each transect file is loaded, older ones
+    among the new are returned as read. A manifest superseded (and removed)
+    while it is being read is skipped, the next call picks up its successor.
+    """
+    manifests = glob.glob(os.path.join(root, '_manifests', '*.json'))
+    latest = {}
+    for manifest in manifests:
+        file, stamp = manifestFile(manifest)
+        latest[file] = max(stamp, latest.get(file, stamp))
+    names = sorted(os.path.basename(m) for m in manifests if os.path.basename(m) not in seen)
+    frames, done = [], []
+    for name in names:
+        manifest = os.path.join(root, '_manifests', name)
+        file, stamp = manifestFile(manifest)
+        if stamp < latest[file]:
+            done.append(name)
+            continue
+        try:
+            with open(manifest) as f:
+                parts = [importData(os.path.join(root, frag), columns=DATA_COLUMNS) for frag in json.load(f)['fragments']]
+        except FileNotFoundError:
+            continue
+        frames.extend(parts)
+        done.append(name)
+    if not frames:
+        return None, done
+    return prepareTransects(pd.concat(frames, ignore_index=True)), done
+
+
+class IngestWatcher(threading.Thread):
+    """Background thread that ingests the inbox and hands newly committed data to the app
+
+    `on_data(df, manifests)` is called with the rows of every manifest this
+    process has not loaded yet, whichever worker (or offline run) wrote it.
+    """
+
+    def __init__(self, root: str, on_data, inbox: str=None, interval: float=30, seen: set=None):
+        super().__init__(daemon=True, name='ingest-watcher')
+        self.root = root
+        self.inbox = inbox
+        self.on_data = on_data
+        self.interval = interval
+        self.seen = set(seen or ())
+        self._halt = threading.Event()
+
+    def poll(self):
+        if self.inbox:
+            for path in claimInbox(self.inbox):
+                # A file that fails is set aside in inbox/failed, the rest still get ingested
+                try:
+                    ingestFile(path, self.root)
+                    dst = 'done'
+                except Exception as e:
+                    print(f'Ingest of {os.path.basename(path)} failed: {e!r}')
+                    dst = 'failed'
+                dst = os.path.join(self.inbox, dst)
+                os.makedirs(dst, exist_ok=True)
+                shutil.move(path, os.path.join(dst, os.path.basename(path)))
+        df, manifests = readManifests(self.root, self.seen)
+        if manifests:
+            self.seen.update(manifests)
+            if df is not None:
+                self.on_data(df, manifests)
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f'Ingest failed: {e!r}')
+
+    def stop(self):
+        self._halt.set()
+
+
+def _atomicWrite(path: str, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    write(tmp)
+    os.replace(tmp, path)
+
+
+if __name__ == '__main__':
+    import sys
+    # From src/: python -m utils.ingest <fragment root> <raw file> [<raw file> ...]
+    for raw in sys.argv[2:]:
+        print(ingestFile(raw, sys.argv[1]))
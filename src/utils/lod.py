@@ -0,0 +1,112 @@
+import math
+import pandas as pd
+import numpy as np
+
+# Resolution of the finest grid level, 2^26 cells spans zoom 18 at 1px per cell
+LOD_BITS = 26
+TILE_PX = 256
+
+
+def mercatorCells(lat, lon, bits: int=LOD_BITS) -> tuple:
+    """Web mercator grid coordinates of lat/lon at 2^bits cells per side"""
+    lat = np.clip(np.asarray(lat, dtype=float), -85.05, 85.05)
+    lon = np.asarray(lon, dtype=float)
+    x = (lon + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(np.radians(lat)) + 1.0 / np.cos(np.radians(lat))) / math.pi) / 2.0
+    n = 2**bits
+    x = np.clip(np.nan_to_num(x * n), 0, n - 1).astype(np.uint32)
+    y = np.clip(np.nan_to_num(y * n), 0, n - 1).astype(np.uint32)
+    return x, y
+
+
+def boundsFromCenter(center: dict, zoom: float, width_px: int=1200, height_px: int=800) -> tuple:
+    """Approximate (west, south, east, north) of a mapbox view without derived corners"""
+    deg_per_px = 360.0 / (TILE_PX * 2**zoom)
+    dlon = deg_per_px * width_px / 2
+    dlat = deg_per_px * height_px / 2 * math.cos(math.radians(center['lat']))
+    return (center['lon'] - dlon, center['lat'] - dlat, center['lon'] + dlon, center['lat'] + dlat)
+
+
+def viewportFromRelayout(relayout: dict, center: dict, zoom: float) -> tuple:
+    """(zoom, bounds) of the current mapbox view from a relayoutData event"""
+    relayout = relayout or {}
+    zoom = relayout.get('mapbox.zoom', zoom)
+    center = relayout.get('mapbox.center', center)
+    corners = (relayout.get('mapbox._derived') or {}).get('coordinates')
+    if corners:
+        lons, lats = zip(*corners)
+        return zoom, (min(lons), min(lats), max(lons), max(lats))
+    return zoom, boundsFromCenter(center, zoom)
+
+
+class LODPyramid:
+    """Multi-resolution grid over sample positions for map point decimation.
+
+    Every row keeps its cell on the finest web mercator grid; coarser levels of
+    the pyramid are a bit shift away, so no per-level copies are stored. A
+    selection is reduced to one representative point per occupied cell at the
+    finest level that fits the point budget for the current viewport.
+    """
+
+    def __init__(self, df: pd.DataFrame, cell_px: int=4):
+        self.mx, self.my = mercatorCells(df.lat.to_numpy(), df.lon.to_numpy())
+        self.cell_px = cell_px
+
+    def viewKey(self, zoom: float, bounds: tuple) -> tuple:
+        """Grid level and tile-snapped bounds of a viewport, stable across small pans"""
+        bits = int(min(LOD_BITS, max(1, math.floor(zoom) + math.log2(TILE_PX / self.cell_px))))
+        # Snap outward to whole map tiles at the current zoom
+        tile_bits = max(0, min(LOD_BITS, math.floor(zoom)))
+        x0, y1 = mercatorCells(bounds[1], bounds[0], tile_bits)
+        x1, y0 = mercatorCells(bounds[3], bounds[2], tile_bits)
+        return bits, tile_bits, (int(x0), int(y0), int(x1), int(y1))
+
+    def decimate(self, frame: pd.DataFrame, rows, param: str, view_key: tuple, max_points: int,
+                 moved: bool=False) -> pd.DataFrame:
+        """Selected rows (frame, at store positions rows) inside the view, aggregated per cell if over max_points
+
+        If the frame's positions are not the stored ones (moved, e.g. coerced
+        onto the reference line) cells are computed from the frame instead.
+        """
+        bits, tile_bits, (x0, y0, x1, y1) = view_key
+        if moved:
+            mx, my = mercatorCells(frame.lat.to_numpy(), frame.lon.to_numpy())
+        else:
+            mx, my = self.mx[rows], self.my[rows]
+        shift = LOD_BITS - tile_bits
+        tx, ty = mx >> shift, my >> shift
+        idx = np.flatnonzero((tx >= x0) & (tx <= x1) & (ty >= y0) & (ty <= y1))
+        if len(idx) <= max_points:
+            return frame.iloc[idx]
+
+        # Coarsen from the zoom level until the occupied cells fit the budget
+        mx, my = mx[idx], my[idx]
+        while True:
+            shift = LOD_BITS - bits
+            code = ((mx >> shift).astype(np.uint64) << np.uint64(bits)) | (my >> shift)
+            cells, inverse, counts = np.unique(code, return_inverse=True, return_counts=True)
+            if len(cells) <= max_points or bits <= 1:
+                break
+            bits -= 1
+
+        # Group rows by cell and reduce each group
+        order = np.argsort(inverse, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        frame = frame.iloc[idx]
+        vals = frame[param].to_numpy(dtype=float)[order]
+        valid = ~np.isnan(vals)
+        n_valid = np.add.reduceat(valid, starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.add.reduceat(np.where(valid, vals, 0.0), starts) / n_valid
+        vmin = np.fmin.reduceat(vals, starts)
+        vmax = np.fmax.reduceat(vals, starts)
+        lat = np.add.reduceat(frame.lat.to_numpy(dtype=float)[order], starts) / counts
+        lon = np.add.reduceat(frame.lon.to_numpy(dtype=float)[order], starts) / counts
+
+        # First row of each cell carries the hover metadata
+        out = frame.iloc[order[starts]].copy()
+        out['lat'], out['lon'] = lat, lon
+        out[param] = mean
+        out[f'{param}_min'], out[f'{param}_max'] = vmin, vmax
+        out['count'] = counts
+        return out
@@ -0,0 +1,217 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from flask import Response, g, has_request_context, request
+
+# Histogram buckets (seconds / bytes) of the exported metrics
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTE_BUCKETS = (1e3, 1e4, 1e5, 3e5, 1e6, 3e6, 1e7, 3e7)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values"""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> list:
+        sep = ',' if labels else ''
+        out = [f'{name}_bucket{{{labels}{sep}le="{bound:g}"}} {n}' for bound, n in zip(self.buckets, self.counts)]
+        out.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        out.append(f'{name}_sum{{{labels}}} {self.sum:.6g}')
+        out.append(f'{name}_count{{{labels}}} {self.count}')
+        return out
+
+
+class _NullStage:
+    """Stand-in when instrumentation is off, rows assigned to it are dropped"""
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class Stage:
+    """Timed block of a callback, optionally tagged with the rows it handled"""
+
+    def __init__(self, instruments: 'Instruments', name: str):
+        self.instruments = instruments
+        self.name = name
+        self.rows = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instruments.record(self.name, time.perf_counter() - self.start, self.rows)
+        return False
+
+
+class Instruments:
+    """Stage timings, row counts and payload sizes of Dash callback requests.
+
+    Callbacks wrap their hot paths in `with instruments.stage('name') as s:`
+    and may set `s.rows`. Per request the stages go out as a Server-Timing
+    header, and all requests are aggregated into Prometheus histograms under
+    /metrics. Slow requests can be dumped with pyinstrument or cProfile. When
+    disabled, stage() hands back a shared no-op and no request hooks are
+    installed.
+    """
+
+    def __init__(self, enabled: bool=False, profiler: str='', slow_ms: float=500, rate: float=1.0,
+                 profile_dir: str='profiles'):
+        self.enabled = enabled
+        self.profiler = profiler if enabled else ''
+        self.slow_ms = slow_ms
+        self.rate = rate
+        self.profile_dir = profile_dir
+        self.gauges = {}
+        self.stage_seconds = defaultdict(lambda: Histogram(TIME_BUCKETS))
+        self.stage_rows = defaultdict(int)
+        self.request_seconds = defaultdict(lambda: Histogram(TIME_BUCKETS))
+        self.response_bytes = defaultdict(lambda: Histogram(BYTE_BUCKETS))
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._afterFork)
+
+    def _afterFork(self):
+        # Background callback jobs are forked mid-request, the lock may be held by another thread
+        self._lock = threading.Lock()
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name)
+
+    def record(self, name: str, seconds: float, rows: int=None):
+        if has_request_context() and 'stages' in g:
+            g.stages.append((name, seconds))
+            callback = g.callback
+        else:
+            callback = 'background'
+        with self._lock:
+            self.stage_seconds[(callback, name)].observe(seconds)
+            if rows is not None:
+                self.stage_rows[(callback, name)] += int(rows)
+
+    def install(self, server, gauges: dict=None):
+        """Register request hooks and the /metrics route on the Flask server"""
+        if not self.enabled:
+            return
+        self.gauges = gauges or {}
+        if self.profiler == 'pyinstrument':
+            from pyinstrument import Profiler # optional, only needed when profiling
+            self._profilerClass = Profiler
+        elif self.profiler == 'cprofile':
+            import cProfile
+            self._profilerClass = cProfile.Profile
+        if self.profiler:
+            os.makedirs(self.profile_dir, exist_ok=True)
+        server.before_request(self._beforeRequest)
+        server.after_request(self._afterRequest)
+        server.add_url_rule('/metrics', 'metrics', self.metrics)
+
+    def _beforeRequest(self):
+        if not request.path.endswith('_dash-update-component'):
+            return
+        g.stages = []
+        g.callback = callbackName(request.get_json(silent=True))
+        g.profile = None
+        if self.profiler and random.random() < self.rate:
+            g.profile = self._profilerClass()
+            if self.profiler == 'pyinstrument':
+                g.profile.start()
+            else:
+                g.profile.enable()
+        g.start = time.perf_counter()
+
+    def _afterRequest(self, response):
+        if 'stages' not in g:
+            return response
+        total = time.perf_counter() - g.start
+        size = response.calculate_content_length() or 0
+        if g.profile is not None:
+            self._dumpProfile(g.profile, total)
+
+        # Whatever the stages don't cover is dispatch and JSON serialization
+        timed = sum(s for _, s in g.stages)
+        timings = [f'{name};dur={s * 1000:.1f}' for name, s in g.stages]
+        timings.append(f'dispatch;dur={max(total - timed, 0) * 1000:.1f}')
+        timings.append(f'total;dur={total * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(timings)
+        with self._lock:
+            self.request_seconds[g.callback].observe(total)
+            self.response_bytes[g.callback].observe(size)
+        return response
+
+    def _dumpProfile(self, profile, total: float):
+        if self.profiler == 'pyinstrument':
+            profile.stop()
+        else:
+            profile.disable()
+        if total * 1000 < self.slow_ms:
+            return
+        stem = os.path.join(self.profile_dir, f'{time.strftime("%Y%m%dT%H%M%S")}-{int(total * 1000)}ms-{g.callback}')
+        if self.profiler == 'pyinstrument':
+            with open(stem + '.html', 'w') as f:
+                f.write(profile.output_html())
+        else:
+            profile.dump_stats(stem + '.prof')
+
+    def metrics(self):
+        """Prometheus text exposition of the collected metrics"""
+        lines = ['# HELP peterson_stage_seconds Time spent in each callback stage',
+                 '# TYPE peterson_stage_seconds histogram']
+        with self._lock:
+            for (callback, name), hist in sorted(self.stage_seconds.items()):
+                lines += hist.lines('peterson_stage_seconds', f'callback="{callback}",stage="{name}"')
+            lines += ['# HELP peterson_stage_rows_total Rows handled by each callback stage',
+                      '# TYPE peterson_stage_rows_total counter']
+            lines += [f'peterson_stage_rows_total{{callback="{callback}",stage="{name}"}} {n}'
+                      for (callback, name), n in sorted(self.stage_rows.items())]
+            lines += ['# HELP peterson_request_seconds Callback request time including serialization',
+                      '# TYPE peterson_request_seconds histogram']
+            for callback, hist in sorted(self.request_seconds.items()):
+                lines += hist.lines('peterson_request_seconds', f'callback="{callback}"')
+            lines += ['# HELP peterson_response_bytes Uncompressed callback response size',
+                      '# TYPE peterson_response_bytes histogram']
+            for callback, hist in sorted(self.response_bytes.items()):
+                lines += hist.lines('peterson_response_bytes', f'callback="{callback}"')
+        for name, read in self.gauges.items():
+            lines.append(f'# TYPE peterson_{name} gauge')
+            lines += [f'peterson_{name}{{key="{k}"}} {v}' for k, v in read().items()]
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def callbackName(body: dict) -> str:
+    """Short label of a callback from its update-component request, e.g. 'spatial-plot.figure'"""
+    if not body:
+        return 'unknown'
+    outputs = body.get('outputs')
+    if isinstance(outputs, list):
+        outputs = outputs[0]
+    if isinstance(outputs, dict):
+        output_id = outputs.get('id')
+        output_id = json.dumps(output_id, sort_keys=True) if isinstance(output_id, dict) else output_id
+        return f"{output_id}.{outputs.get('property')}".replace('"', "'")
+    return str(body.get('output', 'unknown')).strip('.').split('...')[0].replace('"', "'")
@@ -0,0 +1,80 @@
+import numpy as np
+
+# plotly_resampler aggregators by method, looked up on first use since the package is slow to import
+AGGREGATORS = {
+    'minmaxlttb': 'MinMaxLTTB',
+    'lttb': 'LTTB',
+    'minmax': 'MinMaxAggregator',
+}
+
+
+def aggregator(method: str):
+    from plotly_resampler import aggregation
+    return getattr(aggregation, AGGREGATORS[method])()
+
+
+def resampleSeries(x, y, n_out: int, x_range: tuple=None, method: str='minmaxlttb',
+                   order: np.ndarray=None) -> np.ndarray:
+    """Positions of at most n_out points of y(x) kept for display, sorted by x
+
+    NaNs are dropped and, if given, only points inside x_range are considered.
+    Pass a precomputed argsort of x as `order` to share one sort across series.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if order is None:
+        order = np.argsort(x, kind='stable')
+    xs, ys = x[order], y[order]
+    if x_range is not None:
+        # NaN x sorts last, so the range is a contiguous run of the order
+        lo, hi = np.searchsorted(xs, x_range[0], side='left'), np.searchsorted(xs, x_range[1], side='right')
+        order, xs, ys = order[lo:hi], xs[lo:hi], ys[lo:hi]
+    valid = ~(np.isnan(xs) | np.isnan(ys))
+    pos = order[valid]
+    if n_out is None or len(pos) <= n_out:
+        return pos
+    return pos[aggregator(method).arg_downsample(xs[valid], ys[valid], n_out=n_out)]
+
+
+def envelopeError(x, y, kept: np.ndarray, n_bins: int=200) -> dict:
+    """Decimation error of the kept points against the full series
+
+    Both series are binned on x and the per-bin min/max envelopes compared; the
+    error is reported in units of y and relative to the full y range.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    if not valid.any():
+        return {'full': 0, 'shown': 0, 'max_err': 0.0, 'mean_err': 0.0, 'rel_err': 0.0, 'bins': None}
+
+    edges = np.linspace(x[valid].min(), x[valid].max(), n_bins + 1)
+    bins = np.clip(np.searchsorted(edges, np.where(valid, x, edges[0]), side='right') - 1, 0, n_bins - 1)
+    lo_full, hi_full = _binEnvelope(bins[valid], y[valid], n_bins)
+    lo_kept, hi_kept = _binEnvelope(bins[kept], y[kept], n_bins)
+
+    occupied = ~np.isnan(lo_full)
+    err = np.maximum(np.abs(np.nan_to_num(lo_kept[occupied] - lo_full[occupied], nan=np.inf)),
+                     np.abs(np.nan_to_num(hi_kept[occupied] - hi_full[occupied], nan=np.inf)))
+    # Bins with no kept point count as missing the whole bin envelope
+    span = (hi_full - lo_full)[occupied]
+    err = np.where(np.isinf(err), span, err)
+    y_span = float(y[valid].max() - y[valid].min()) or 1.0
+    return {
+        'full': int(valid.sum()),
+        'shown': int(len(kept)),
+        'max_err': float(err.max()),
+        'mean_err': float(err.mean()),
+        'rel_err': float(err.max() / y_span),
+        'bins': (edges, lo_full, hi_full),
+    }
+
+
+def _binEnvelope(bins: np.ndarray, y: np.ndarray, n_bins: int) -> tuple:
+    lo = np.full(n_bins, np.inf)
+    hi = np.full(n_bins, -np.inf)
+    np.minimum.at(lo, bins, y)
+    np.maximum.at(hi, bins, y)
+    lo[np.isinf(lo)] = np.nan
+    hi[np.isinf(hi)] = np.nan
+    return lo, hi
@@ -0,0 +1,77 @@
+import bisect
+import pandas as pd
+import numpy as np
+
+# Pandas period frequency of each rollup, seasons are DJF/MAM/JJA/SON (quarters ending in November)
+ROLLUP_PERIODS = {'month': 'M', 'season': 'Q-NOV'}
+ROLLUP_STATS = ['count', 'mean', 'q25', 'q50', 'q75']
+
+
+def periodStarts(datetimes: pd.Series, period: str) -> pd.Series:
+    """Start timestamp of the month or season of each datetime"""
+    return datetimes.dt.to_period(ROLLUP_PERIODS[period]).dt.start_time
+
+
+def rollupFrame(df: pd.DataFrame, period: str, params: list) -> pd.DataFrame:
+    """Per (period, station_id) count, mean and quartiles of each parameter"""
+    groups = df.groupby([periodStarts(df.datetime, period).rename('period'), df.station_id], sort=True)[params]
+    agg = groups.agg(['count', 'mean'])
+    quant = groups.quantile([0.25, 0.5, 0.75]).unstack()
+    quant.columns = pd.MultiIndex.from_tuples([(p, f'q{round(q * 100)}') for p, q in quant.columns])
+    return pd.concat([agg, quant], axis=1).reindex(columns=pd.MultiIndex.from_product([params, ROLLUP_STATS]))
+
+
+class SeasonalRollups:
+    """Station x month and station x season aggregates for the trends view.
+
+    Built once from the transect store, then refreshed one period at a time:
+    the store is sorted by survey date, so the rows of any month or season
+    are a contiguous range and only periods touched by new files are redone.
+    """
+
+    def __init__(self, params: list):
+        self.params = list(params)
+        self.tables = {}
+
+    @classmethod
+    def fromStore(cls, store, params: list) -> 'SeasonalRollups':
+        rollups = cls(params)
+        for period in ROLLUP_PERIODS:
+            rollups.tables[period] = rollupFrame(store.df, period, rollups.params)
+        return rollups
+
+    def copy(self) -> 'SeasonalRollups':
+        rollups = SeasonalRollups(self.params)
+        rollups.tables = dict(self.tables)
+        return rollups
+
+    def update(self, store, datetimes: pd.Series):
+        """Recompute the periods containing the given sample datetimes"""
+        dates = store.dates
+        for period, table in self.tables.items():
+            starts = periodStarts(pd.Series(pd.to_datetime(datetimes)).dropna(), period).unique()
+            parts = [table[~table.index.get_level_values('period').isin(starts)]]
+            for start in starts:
+                stop = (pd.Period(start, ROLLUP_PERIODS[period]) + 1).start_time
+                # Rows of survey dates in [start, stop) are one contiguous range
+                lo = bisect.bisect_left(dates, start.strftime('%Y-%m-%d'))
+                hi = bisect.bisect_left(dates, stop.strftime('%Y-%m-%d'))
+                if lo < hi:
+                    rows = slice(store.dateRange(dates[lo])[0], store.dateRange(dates[hi - 1])[1])
+                    parts.append(rollupFrame(store.df.iloc[rows], period, self.params))
+            self.tables[period] = pd.concat(parts).sort_index()
+
+    def heatmap(self, param: str, period: str='month', stat: str='mean') -> pd.DataFrame:
+        """Station by period matrix of one statistic"""
+        return self.tables[period][(param, stat)].unstack('period')
+
+    def trend(self, param: str, period: str='month', stations: list=None) -> pd.DataFrame:
+        """Per-period statistics of the given stations, or count-weighted across all stations"""
+        table = self.tables[period][param]
+        if stations:
+            return table[table.index.get_level_values('station_id').isin(stations)]
+        # Quartiles don't combine across stations, only the count and mean are kept
+        weighted = (table['mean'] * table['count']).groupby(level='period').sum()
+        count = table['count'].groupby(level='period').sum()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.DataFrame({'count': count, 'mean': weighted / count})
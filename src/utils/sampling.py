@@ -0,0 +1,119 @@
+from functools import lru_cache
+import threading
+import numpy as np
+
+# Sampling modes offered in the sample mode dropdown
+SAMPLE_MODES = ('uniform', 'station', 'date')
+
+
+class Draws:
+    """Lazy seeded draw order over range(n), extended only as far as it is read.
+
+    Candidates come from the generator in chunks of fixed, doubling sizes and
+    repeats are dropped, so the order only depends on the seed, never on how
+    far earlier reads went. Once half of the range is drawn the rest is
+    appended as one shuffle. Memory and time follow the drawn prefix, not n.
+    """
+
+    FIRST_CHUNK = 1024
+
+    def __init__(self, n: int, seed):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        dtype = np.int32 if n < 2**31 else np.int64
+        if n <= self.FIRST_CHUNK:
+            self.drawn = self.rng.permutation(n).astype(dtype)
+        else:
+            self.drawn = np.empty(0, dtype=dtype)
+        self.chunk = self.FIRST_CHUNK
+        self._lock = threading.Lock()
+
+    def take(self, k: int) -> np.ndarray:
+        """First k positions of the order"""
+        k = min(k, self.n)
+        with self._lock:
+            while len(self.drawn) < k:
+                self._extend()
+            return self.drawn[:k]
+
+    def _extend(self):
+        if 2 * len(self.drawn) >= self.n:
+            rest = np.setdiff1d(np.arange(self.n, dtype=self.drawn.dtype), self.drawn, assume_unique=True)
+            self.drawn = np.concatenate([self.drawn, self.rng.permutation(rest)])
+            return
+        cand = self.rng.integers(0, self.n, size=self.chunk, dtype=np.int64)
+        self.chunk *= 2
+        _, first = np.unique(cand, return_index=True)
+        cand = cand[np.sort(first)] # first occurrence of each, in draw order
+        cand = cand[~np.isin(cand, self.drawn)]
+        self.drawn = np.concatenate([self.drawn, cand.astype(self.drawn.dtype)])
+
+
+class Sampler:
+    """Deterministic, prefix-stable samples of a TransectStore.
+
+    Each (mode, seed) pair maps to one seeded draw order, kept in a small
+    LRU. Orders are drawn lazily per stratum (stations, survey dates, or the
+    whole store for uniform), so a sample of size n costs O(n log n) time and
+    O(n) memory whatever the store size, and raising the sample size only
+    appends rows to the previous sample. Stratified modes draw round-robin
+    across strata, so every stratum gets an equal share until it runs out of
+    rows.
+    """
+
+    def __init__(self, store, max_orders: int=4):
+        self.store = store
+        self.order = lru_cache(maxsize=max_orders)(self._order)
+        self.strata = lru_cache(maxsize=None)(self._strata)
+
+    def _strata(self, mode: str) -> list:
+        """Rows of every stratum, as a (start, stop) range or a position array"""
+        if mode == 'uniform':
+            return [(0, len(self.store))]
+        if mode == 'station':
+            strata = list(self.store.station_rows.values())
+            if sum(len(rows) for rows in strata) < len(self.store):
+                # Rows without a station are their own stratum
+                missing = np.ones(len(self.store), dtype=bool)
+                for rows in strata:
+                    missing[rows] = False
+                strata.append(np.flatnonzero(missing))
+            return strata
+        if mode == 'date':
+            return list(self.store.date_offsets.values())
+        raise ValueError(f'Unknown sampling mode: {mode}')
+
+    def _order(self, mode: str, seed: int) -> tuple:
+        """Stratum sizes in draw position order, their rows, and a lazy draw order per stratum"""
+        strata = self.strata(mode)
+        # Shuffle the strata too so leftover picks don't always favour the same ones
+        position = np.random.default_rng(seed).permutation(len(strata)) if mode != 'uniform' else np.arange(len(strata))
+        strata = [strata[i] for i in position]
+        sizes = np.array([s[1] - s[0] if isinstance(s, tuple) else len(s) for s in strata], dtype=np.int64)
+        draws = [Draws(int(size), (seed, int(i))) for size, i in zip(sizes, position)]
+        return sizes, strata, draws
+
+    def sample(self, mode: str, n: int, seed: int) -> np.ndarray:
+        """Row positions of a sample in draw order, the first rows of any larger sample"""
+        sizes, strata, draws = self.order(mode, seed)
+        n = min(n, int(sizes.sum()))
+        # Full rounds every stratum still has rows for, then one pick from the first strata left
+        lo, hi = 0, int(sizes.max(initial=0))
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            lo, hi = (mid, hi) if np.minimum(sizes, mid).sum() <= n else (lo, mid - 1)
+        take = np.minimum(sizes, lo)
+        extra = np.flatnonzero(sizes > lo)[:n - int(take.sum())]
+        take[extra] += 1
+
+        rows, keys = [], []
+        for pos, (k, stratum, drawn) in enumerate(zip(take, strata, draws)):
+            if not k:
+                continue
+            picks = drawn.take(int(k))
+            rows.append(picks.astype(np.int64) + stratum[0] if isinstance(stratum, tuple) else stratum[picks])
+            keys.append(np.arange(k, dtype=np.int64) * len(strata) + pos)
+        if len(rows) < 2:
+            return rows[0] if rows else np.empty(0, dtype=np.int64)
+        rows, keys = np.concatenate(rows), np.concatenate(keys)
+        return rows[np.argsort(keys, kind='stable')].astype(np.int64)
@@ -0,0 +1,70 @@
+"""Transect dataset shared between worker processes as an Arrow IPC file in shared memory.
+
+The serving process publishes the prepared, store-ordered frame once and
+every worker attaches to the segment by name. Numeric and datetime columns
+come back as read-only views of the segment, so N workers hold one copy of
+them instead of N.
+
+Only those columns are shared. String columns are decoded into every
+worker, and each worker builds its own indexes over the rows: store
+station/file row lists, LOD grid cells and the spatial index come to about
+56 bytes per row. Per-worker memory still grows with the dataset, roughly
+as fast as the shared numeric data does.
+"""
+import os
+from multiprocessing import resource_tracker, shared_memory
+import pandas as pd
+import pyarrow as pa
+
+
+class _Attached(shared_memory.SharedMemory):
+    """Segment mapped by a worker, left to the OS to unmap at exit while frames still view it"""
+
+    def __init__(self, name: str):
+        # Workers forked from the publisher share its resource tracker. One started
+        # any other way gets a tracker of its own, which would unlink the segment
+        # when the worker exits, so the segment is untracked there
+        private = resource_tracker._resource_tracker._fd is None
+        super().__init__(name=name)
+        if private and os.name == 'posix':
+            resource_tracker.unregister(self._name, 'shared_memory')
+
+    def __del__(self):
+        pass
+
+
+# Attached segments, kept open for as long as frames may view them
+_segments = {}
+
+
+def arrowTable(df: pd.DataFrame) -> pa.Table:
+    # NaN stays a float value instead of becoming a null, so the column maps back without a copy
+    return pa.table({c: pa.array(df[c].to_numpy(), from_pandas=False) if df[c].dtype.kind == 'f' else pa.array(df[c])
+                     for c in df.columns})
+
+
+def _writeTable(sink, table: pa.Table):
+    # One record batch, so every column is a single contiguous buffer
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=max(len(table), 1))
+
+
+def publishFrame(df: pd.DataFrame, name: str=None) -> shared_memory.SharedMemory:
+    """Copy df into a new shared memory segment, the caller closes and unlinks it"""
+    table = arrowTable(df)
+    size = pa.MockOutputStream()
+    _writeTable(size, table)
+    shm = shared_memory.SharedMemory(name=name, create=True, size=size.size())
+    buf = pa.py_buffer(shm.buf)
+    _writeTable(pa.FixedSizeBufferWriter(buf), table)
+    del buf # release the export so the segment can be closed
+    return shm
+
+
+def attachFrame(name: str) -> pd.DataFrame:
+    """Frame viewing a published segment, string columns are the only per-process copies"""
+    shm = _segments.get(name)
+    if shm is None:
+        shm = _segments[name] = _Attached(name=name)
+    table = pa.ipc.open_file(pa.py_buffer(shm.buf)).read_all()
+    return table.to_pandas(split_blocks=True)
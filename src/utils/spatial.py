@@ -0,0 +1,170 @@
+import pandas as pd
+import numpy as np
+
+from utils.lod import LOD_BITS, mercatorCells, viewportFromRelayout
+
+# Most grid squares a query box is split into before the rest is tested point by point
+MAX_COVER_CELLS = 64
+
+
+def spreadBits(v: np.ndarray) -> np.ndarray:
+    """Bits of v (up to 32) moved to the even bit positions"""
+    v = np.asarray(v, dtype=np.int64)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        v = (v | (v << shift)) & mask
+    return v
+
+
+def mortonCodes(x, y) -> np.ndarray:
+    """Z-order (geohash-style) code of grid cells, a cell's code prefix is its parent square"""
+    return (spreadBits(x) << 1) | spreadBits(y)
+
+
+def coverSquares(x0: int, y0: int, x1: int, y1: int, bits: int=LOD_BITS, max_cells: int=MAX_COVER_CELLS) -> tuple:
+    """Code ranges (lo, hi) of grid squares covering the cell box [x0, x1] x [y0, y1]
+
+    Squares are split quadtree-style, starting from the few squares at least
+    as large as the box, while at most max_cells of them cross the box edge.
+    Returns the ranges of squares strictly inside the box, and of squares on
+    its edge whose rows still have to be tested against the exact region.
+    """
+    start = max(0, bits - (max(x1 - x0, y1 - y0) + 1).bit_length())
+    shift = bits - start
+    gx, gy = np.arange(x0 >> shift, (x1 >> shift) + 1), np.arange(y0 >> shift, (y1 >> shift) + 1)
+    cx, cy = np.repeat(gx, len(gy)), np.tile(gy, len(gx))
+    inside = []
+    for level in range(start, bits + 1):
+        shift = bits - level
+        lo_x, lo_y = cx << shift, cy << shift
+        hi_x, hi_y = lo_x + (1 << shift) - 1, lo_y + (1 << shift) - 1
+        overlap = (hi_x >= x0) & (lo_x <= x1) & (hi_y >= y0) & (lo_y <= y1)
+        # Cells on the box edge are only partly inside the region, so they count as edge
+        full = (lo_x > x0) & (hi_x < x1) & (lo_y > y0) & (hi_y < y1)
+        inside.append((mortonCodes(cx[full], cy[full]), shift))
+        cx, cy = cx[overlap & ~full], cy[overlap & ~full]
+        if not len(cx) or level == bits or 4 * len(cx) > max_cells:
+            inside.append((mortonCodes(cx, cy), shift))
+            break
+        # Children of the edge squares at the next level
+        cx = np.repeat(cx << 1, 4) + np.tile([0, 0, 1, 1], len(cx))
+        cy = np.repeat(cy << 1, 4) + np.tile([0, 1, 0, 1], len(cy))
+    ranges = [(code << (2 * shift), (code + 1) << (2 * shift)) for code, shift in inside]
+    edge = ranges.pop()
+    return (np.concatenate([lo for lo, _ in ranges]), np.concatenate([hi for _, hi in ranges])), edge
+
+
+def inPolygon(lon: np.ndarray, lat: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """Even-odd test of points against a closed or open ring of (lon, lat) vertices"""
+    mask = np.zeros(len(lon), dtype=bool)
+    x0, y0 = polygon[-1]
+    for x1, y1 in polygon:
+        crosses = (y1 > lat) != (y0 > lat)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            at = x1 + (lat - y1) * (x0 - x1) / (y0 - y1)
+        mask ^= crosses & (lon < at)
+        x0, y0 = x1, y1
+    return mask
+
+
+def regionMask(region: tuple, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """Exact test of points against a ('bbox', w, s, e, n) or ('polygon', ((lon, lat), ...)) region"""
+    if region[0] == 'polygon':
+        return inPolygon(lon, lat, np.asarray(region[1], dtype=float))
+    _, west, south, east, north = region
+    return (lon >= west) & (lon <= east) & (lat >= south) & (lat <= north)
+
+
+def regionFromSelection(selected: dict) -> tuple:
+    """Box or lasso region of a map selectedData event, None if nothing is selected"""
+    if not selected:
+        return None
+    lasso = (selected.get('lassoPoints') or {}).get('mapbox')
+    if lasso:
+        return ('polygon', tuple((round(lon, 5), round(lat, 5)) for lon, lat in lasso))
+    box = (selected.get('range') or {}).get('mapbox')
+    if box:
+        (lon0, lat0), (lon1, lat1) = box
+        return ('bbox', round(min(lon0, lon1), 5), round(min(lat0, lat1), 5),
+                round(max(lon0, lon1), 5), round(max(lat0, lat1), 5))
+    return None
+
+
+def regionFromView(relayout: dict, center: dict, zoom: float) -> tuple:
+    """Bounding box region of the current map view"""
+    _, (west, south, east, north) = viewportFromRelayout(relayout, center, zoom)
+    return ('bbox', round(west, 5), round(south, 5), round(east, 5), round(north, 5))
+
+
+class SpatialIndex:
+    """Z-order index over sample positions for map viewport and lasso queries.
+
+    Rows are kept sorted by the Morton code of their web mercator cell (the
+    LODPyramid grid), so every grid-aligned square is one contiguous run of
+    that order. A query box is covered by a few such squares, each found with
+    a binary search, and only rows in squares crossing the box edge (or, for
+    a lasso, in the polygon's bounding box) are tested against the region.
+    Regions holding most of the data fall back to a plain scan.
+    """
+
+    def __init__(self, df: pd.DataFrame, bits: int=LOD_BITS):
+        self.bits = bits
+        self.n = len(df)
+        self.lat, self.lon = df.lat.to_numpy(dtype=float), df.lon.to_numpy(dtype=float)
+        codes = mortonCodes(*mercatorCells(self.lat, self.lon, bits))
+        self.order = np.argsort(codes, kind='stable')
+        self.codes = codes[self.order]
+        # Positions in index order, so rows of a square are contiguous for the edge tests
+        self.z_lat, self.z_lon = self.lat[self.order], self.lon[self.order]
+
+    def _runs(self, lo: np.ndarray, hi: np.ndarray) -> tuple:
+        """Start and length (in index order) of the non-empty runs of rows in code ranges [lo, hi)"""
+        starts, stops = np.searchsorted(self.codes, lo), np.searchsorted(self.codes, hi)
+        keep = stops > starts
+        return starts[keep], (stops - starts)[keep]
+
+    @staticmethod
+    def _positions(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Concatenated aranges of the runs: each run's start, then steps of one"""
+        steps = np.ones(counts.sum(), dtype=np.int64)
+        steps[0:1] = starts[:1]
+        steps[np.cumsum(counts)[:-1]] = starts[1:] - (starts[:-1] + counts[:-1] - 1)
+        return np.cumsum(steps)
+
+    def query(self, region: tuple) -> np.ndarray:
+        """Ascending row positions inside a ('bbox', w, s, e, n) or ('polygon', ((lon, lat), ...)) region"""
+        if region[0] == 'polygon':
+            (west, south), (east, north) = np.min(region[1], axis=0), np.max(region[1], axis=0)
+        else:
+            _, west, south, east, north = region
+        # Mercator y grows southward
+        x0, y0 = mercatorCells(north, west, self.bits)
+        x1, y1 = mercatorCells(south, east, self.bits)
+        inside, edge = coverSquares(int(x0), int(y0), int(x1), int(y1), self.bits)
+        inside, edge = self._runs(*inside), self._runs(*edge)
+        if inside[1].sum() + edge[1].sum() > self.n // 4:
+            # Most rows are candidates, a straight scan beats gathering them
+            return np.flatnonzero(regionMask(region, self.lon, self.lat))
+
+        near = self._positions(*edge)
+        near = near[regionMask(('bbox', west, south, east, north), self.z_lon[near], self.z_lat[near])]
+        idx = np.concatenate([self._positions(*inside), near])
+        if region[0] == 'polygon':
+            idx = idx[regionMask(region, self.z_lon[idx], self.z_lat[idx])]
+        return np.sort(self.order[idx])
+
+    def within(self, region: tuple, rows):
+        """The selected rows (slice or positions, in their order) that lie inside region
+
+        Small position arrays (e.g. samples) are tested directly, larger
+        selections are intersected with the index query.
+        """
+        if region is None:
+            return rows
+        if not isinstance(rows, slice) and len(rows) < self.n // 64:
+            return rows[regionMask(region, self.lon[rows], self.lat[rows])]
+        hits = self.query(region)
+        if isinstance(rows, slice):
+            lo, hi = np.searchsorted(hits, [rows.start or 0, self.n if rows.stop is None else rows.stop])
+            return hits[lo:hi]
+        return rows[np.isin(rows, hits)]
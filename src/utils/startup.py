@@ -0,0 +1,74 @@
+"""Offline startup artifact: what a worker needs before it can serve, precomputed.
+
+The artifact holds two pickles back to back. The header (date list, row count
+and global metadata table) is read at import in milliseconds so the layout
+can be served at once. The body (metadata cube and trend rollups) is read by
+the background loader instead of being rebuilt from every row.
+
+Build it next to the dataset from src/:  python -m utils.startup <dst> [data_path]
+"""
+import hashlib
+import os
+import pickle
+import sys
+
+from utils.const import *
+from utils.func import importData, prepareTransects
+from utils.store import TransectStore
+from utils.cubes import StatsCube
+from utils.rollups import SeasonalRollups
+
+
+def dataFingerprint(path: str, probe: int=2**20) -> tuple:
+    """Size plus a hash of the head and tail of the dataset, stable across copies"""
+    size = os.path.getsize(path)
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        digest.update(f.read(probe))
+        f.seek(max(size - probe, 0))
+        digest.update(f.read(probe))
+    return size, digest.hexdigest()
+
+
+def transectDates(store: TransectStore) -> list:
+    """Survey dates of every transect file, for the date dropdown"""
+    return sorted(store.df.groupby('file')['datetime'].min().dt.date.astype(str).to_list())
+
+
+def writeStartup(dst: str, data_path: str=DATA_PATH, store: TransectStore=None):
+    """Build the artifact for data_path, from scratch unless its store is already loaded"""
+    if store is None:
+        store = TransectStore(prepareTransects(importData(data_path, columns=DATA_COLUMNS)))
+    cube = StatsCube.fromFrame(store.df)
+    header = {
+        'fingerprint': dataFingerprint(data_path),
+        'version': store.version,
+        'rows': len(store),
+        'dates': transectDates(store),
+        'metadata': cube.summary(),
+    }
+    body = {'cube': cube, 'rollups': SeasonalRollups.fromStore(store, PARAMS_TO_PLOT)}
+    tmp = dst + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(body, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, dst)
+
+
+def readStartupHeader(path: str, data_path: str=DATA_PATH) -> dict:
+    """Artifact header, None if there is no artifact or it was built from other data"""
+    if not path or not os.path.exists(path) or not os.path.exists(data_path):
+        return None
+    with open(path, 'rb') as f:
+        header = pickle.load(f)
+    return header if header['fingerprint'] == dataFingerprint(data_path) else None
+
+
+def readStartupBody(path: str) -> dict:
+    with open(path, 'rb') as f:
+        pickle.load(f) # skip the header
+        return pickle.load(f)
+
+
+if __name__ == '__main__':
+    writeStartup(sys.argv[1], *sys.argv[2:3])
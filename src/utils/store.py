@@ -0,0 +1,83 @@
+import pandas as pd
+import numpy as np
+
+
+class TransectStore:
+    """Read-only, pre-indexed transect dataset built once at startup.
+
+    Rows are sorted by survey date / file so every date is one contiguous
+    row range, and every station keeps an array of its row positions. Filters
+    return slices or takes of the selected rows instead of scanning and
+    copying the whole frame.
+    """
+
+    def __init__(self, df: pd.DataFrame, version: str='base'):
+        self.version = version
+        dates = df.datetime.dt.normalize()
+        order = np.lexsort((df.datetime.to_numpy(), df.file.to_numpy(), dates.to_numpy()))
+        if np.array_equal(order, np.arange(len(df))):
+            # Already in store order (e.g. a converted arrow file), keep the columns as-is
+            self.df = df if df.index.equals(pd.RangeIndex(len(df))) else df.reset_index(drop=True)
+        else:
+            self.df = df.take(order).reset_index(drop=True)
+
+        # Row range [start, stop) per survey date
+        sorted_dates = dates.to_numpy()[order]
+        uniq, starts = np.unique(sorted_dates, return_index=True)
+        stops = np.append(starts[1:], len(sorted_dates))
+        self.date_offsets = {str(d)[:10]: (int(a), int(b)) for d, a, b in zip(uniq, starts, stops)}
+
+        # Ascending row positions per station
+        self.station_rows = {k: np.asarray(v, dtype=np.int64)
+                             for k, v in self.df.groupby('station_id', sort=False).indices.items()}
+
+        # Ascending row positions per transect file
+        self.file_rows = {k: np.asarray(v, dtype=np.int64)
+                          for k, v in self.df.groupby('file', sort=False).indices.items()}
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    @property
+    def dates(self) -> list:
+        return list(self.date_offsets)
+
+    def dateRange(self, date: str) -> tuple:
+        """Row range [start, stop) for a survey date, empty if unknown"""
+        return self.date_offsets.get(date, (0, 0))
+
+    def fileRows(self, file: str) -> np.ndarray:
+        """Sorted row positions of a transect file"""
+        return self.file_rows.get(file, np.empty(0, dtype=np.int64))
+
+    def stationRows(self, stations, start: int=0, stop: int=None) -> np.ndarray:
+        """Sorted row positions of the given stations, optionally within a row range"""
+        stop = len(self.df) if stop is None else stop
+        parts = []
+        for sta in stations:
+            rows = self.station_rows.get(sta)
+            if rows is None:
+                continue
+            lo, hi = np.searchsorted(rows, [start, stop])
+            parts.append(rows[lo:hi])
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    def rows(self, date: str=None, stations: list=None):
+        """Selected rows as a slice (date only) or a position array"""
+        if date:
+            start, stop = self.dateRange(date)
+            if not stations:
+                return slice(start, stop)
+            return self.stationRows(stations, start, stop)
+        if stations:
+            return self.stationRows(stations)
+        return slice(0, len(self.df))
+
+    def select(self, date: str=None, stations: list=None) -> pd.DataFrame:
+        """Rows matching a survey date and/or list of stations"""
+        rows = self.rows(date, stations)
+        if isinstance(rows, slice):
+            return self.df.iloc[rows]
+        return self.df.take(rows)
@@ -0,0 +1,50 @@
+import base64
+import numpy as np
+import plotly.graph_objects as go
+
+# Trace attributes sent as typed arrays
+BINARY_ATTRS = [('lat',), ('lon',), ('x',), ('y',), ('marker', 'color')]
+
+
+def encodeArray(values, float32: bool=True):
+    """Numeric array as a plotly.js typed array spec ({dtype, bdata}); other values unchanged"""
+    if isinstance(values, dict):
+        if 'bdata' not in values or 'shape' in values:
+            return values
+        values = decodeArray(values)
+    arr = np.asarray(values)
+    if arr.dtype.kind not in 'fiub' or arr.ndim != 1:
+        return values
+    if arr.dtype.kind == 'b':
+        arr = arr.astype('<u1')
+    elif arr.dtype.kind in 'iu' and arr.dtype.itemsize <= 4:
+        arr = arr.astype(arr.dtype.newbyteorder('<'), copy=False)
+    elif arr.dtype.kind in 'iu' and len(arr) and np.abs(arr).max() < 2**31:
+        arr = arr.astype('<i4') # plotly.js has no 64-bit integer arrays
+    else:
+        arr = arr.astype('<f4' if float32 else '<f8', copy=False)
+    arr = np.ascontiguousarray(arr)
+    return {'dtype': arr.dtype.str[1:], 'bdata': base64.b64encode(arr.tobytes()).decode('ascii')}
+
+
+def decodeArray(spec: dict) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(spec['bdata']), dtype='<' + spec['dtype'])
+
+
+def encodeFigure(fig, float32: bool=True) -> dict:
+    """Figure dict with the bulky numeric trace arrays base64 encoded
+
+    Needs plotly.js >= 2.28 in the browser (Dash >= 2.15) to decode typed arrays.
+    """
+    fig = fig.to_plotly_json() if isinstance(fig, go.Figure) else fig
+    for trace in fig.get('data', []):
+        for path in BINARY_ATTRS:
+            parent = trace
+            for key in path[:-1]:
+                parent = parent.get(key)
+                if not isinstance(parent, dict):
+                    break
+            else:
+                if path[-1] in parent and parent[path[-1]] is not None:
+                    parent[path[-1]] = encodeArray(parent[path[-1]], float32)
+    return fig